@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+""" Channel churn benchmark
+
+    Open and close short-lived channels between two in-memory connections,
+    with and without channel pooling.
+"""
+
+import argparse
+import time
+
+
+try:
+    import tcpchan  # noqa: F401
+except ImportError:
+    import os
+    import sys
+
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tcpchan.core.chan import BufferedChannel
+from tcpchan.core.chan import Channel
+from tcpchan.core.conn import Connection
+from tcpchan.core.evt import DataTransmit
+
+
+class ChurnChannel(Channel):
+    def data_received(self, data):
+        pass
+
+
+class DrainingChannel(BufferedChannel):
+    def data_available(self):
+        self.read()
+
+
+def pump(src, dst):
+    while True:
+        ev = src.next_event()
+        if ev is None:
+            break
+
+        if type(ev) == DataTransmit:
+            dst.data_received(ev.payload)
+
+
+def bench(channel_factory, pool_size, channels, batch):
+    client = Connection(channel_factory, channel_pool_size=pool_size)
+    server = Connection(channel_factory, channel_pool_size=pool_size)
+    payload = b"x" * 64
+
+    start = time.perf_counter()
+    for _ in range(channels // batch):
+        opened = [client.create_channel(data=payload) for _ in range(batch)]
+        pump(client, server)
+
+        for channel in opened:
+            channel.close()
+        pump(client, server)
+        pump(server, client)
+
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--channels", type=int, default=200000)
+    parser.add_argument("-b", "--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    for name, channel_factory in (
+        ("Channel", ChurnChannel),
+        ("BufferedChannel", DrainingChannel),
+    ):
+        for pool_size in (0, args.batch):
+            elapsed = bench(channel_factory, pool_size, args.channels, args.batch)
+            print(
+                f"{name:>16} pool={pool_size:<6}: "
+                f"{args.channels / elapsed:10.0f} channels/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
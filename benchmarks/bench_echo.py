@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+""" Echo benchmark
+
+    Send bursts of small frames over many channels to an echo server on the
+    loopback interface and measure the round-trip throughput.
+"""
+
+import argparse
+import asyncio
+import time
+
+
+try:
+    import tcpchan  # noqa: F401
+except ImportError:
+    import os
+    import sys
+
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tcpchan.aio import TCPChanClientProtocol
+from tcpchan.aio import TCPChanServerProtocol
+from tcpchan.core.chan import Channel
+
+
+class EchoChannel(Channel):
+    def data_received(self, data):
+        self.write_data(data)
+
+
+class CountingChannel(Channel):
+    received = 0
+    done = None
+
+    def data_received(self, data):
+        CountingChannel.received += len(data)
+        if CountingChannel.received >= CountingChannel.expected:
+            CountingChannel.done.set_result(None)
+
+
+class ClientProtocol(TCPChanClientProtocol):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ready = asyncio.get_event_loop().create_future()
+
+    def handshake_success(self):
+        self.ready.set_result(None)
+
+
+async def bench(channels, bursts, burst_size, size):
+    loop = asyncio.get_event_loop()
+    server = await loop.create_server(
+        lambda: TCPChanServerProtocol(EchoChannel), host="127.0.0.1", port=0
+    )
+    port = server.sockets[0].getsockname()[1]
+
+    transport, client = await loop.create_connection(
+        lambda: ClientProtocol(CountingChannel), host="127.0.0.1", port=port
+    )
+    await client.ready
+
+    opened = [client.create_channel() for _ in range(channels)]
+    payload = b"x" * size
+
+    CountingChannel.expected = bursts * burst_size * channels * size
+    CountingChannel.done = loop.create_future()
+
+    start = time.perf_counter()
+    for _ in range(bursts):
+        client.transmit_many(
+            (channel.channel_id, payload)
+            for _ in range(burst_size)
+            for channel in opened
+        )
+        await asyncio.sleep(0)
+
+    await CountingChannel.done
+    elapsed = time.perf_counter() - start
+
+    transport.close()
+    server.close()
+    await server.wait_closed()
+
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-c", "--channels", type=int, default=100)
+    parser.add_argument("-b", "--bursts", type=int, default=200)
+    parser.add_argument("-n", "--burst-size", type=int, default=10)
+    parser.add_argument("-s", "--size", type=int, default=128)
+    args = parser.parse_args()
+
+    elapsed = asyncio.run(bench(args.channels, args.bursts, args.burst_size, args.size))
+    frames = args.channels * args.bursts * args.burst_size
+    print(f"echo: {frames / elapsed:10.0f} frames/s")
+    print(f"echo: {frames * args.size / elapsed / 1e6:10.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+""" Fan-out benchmark
+
+    Compare encoding the same update for many channels with one
+    ```channel_transmit_data``` call per channel against a single
+    ```transmit_many``` call.
+"""
+
+import argparse
+import time
+
+
+try:
+    import tcpchan  # noqa: F401
+except ImportError:
+    import os
+    import sys
+
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tcpchan.core.chan import Channel
+from tcpchan.core.conn import Connection
+
+
+def drain(conn):
+    while conn.next_event() is not None:
+        pass
+
+
+def bench_per_channel(conn, channel_ids, payload, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for channel_id in channel_ids:
+            conn.channel_transmit_data(channel_id, payload)
+        drain(conn)
+
+    return time.perf_counter() - start
+
+
+def bench_transmit_many(conn, channel_ids, payload, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        conn.transmit_many((channel_id, payload) for channel_id in channel_ids)
+        drain(conn)
+
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-c", "--channels", type=int, default=5000)
+    parser.add_argument("-r", "--rounds", type=int, default=50)
+    parser.add_argument("-s", "--size", type=int, default=256)
+    args = parser.parse_args()
+
+    conn = Connection(Channel)
+    channel_ids = list(range(1, args.channels + 1))
+    payload = b"x" * args.size
+    frames = args.channels * args.rounds
+
+    for name, bench in (
+        ("channel_transmit_data", bench_per_channel),
+        ("transmit_many", bench_transmit_many),
+    ):
+        elapsed = bench(conn, channel_ids, payload, args.rounds)
+        print(f"{name:>22}: {frames / elapsed:10.0f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+""" Import time benchmark
+
+    Measure the time taken by common tcpchan imports, each in a fresh
+    interpreter.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATEMENTS = (
+    "import tcpchan",
+    "from tcpchan.core import Connection",
+    "from tcpchan.core import ChannelPayload",
+    "from tcpchan.core import *",
+    "from tcpchan.aio import TCPChanClientProtocol",
+)
+
+TIMER = """
+import time
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+"""
+
+
+def measure(statement):
+    output = subprocess.check_output(
+        [sys.executable, "-c", TIMER.format(statement=statement)], cwd=ROOT
+    )
+    return float(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-r", "--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for statement in STATEMENTS:
+        elapsed = statistics.median(measure(statement) for _ in range(args.repeat))
+        print(f"{statement:>46}: {elapsed * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
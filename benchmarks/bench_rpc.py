@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+""" RPC benchmark
+
+    Compare request/response throughput of ```RPCChannel``` multiplexing calls
+    over one long-lived channel against opening one channel per request, both
+    over a loopback TCP connection.
+"""
+
+import argparse
+import asyncio
+import time
+
+
+try:
+    import tcpchan  # noqa: F401
+except ImportError:
+    import os
+    import sys
+
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tcpchan.aio import RPCChannel
+from tcpchan.aio import TCPChanClientProtocol
+from tcpchan.aio import TCPChanServerProtocol
+from tcpchan.core.chan import Channel
+
+
+class EchoRPCChannel(RPCChannel):
+    def request_received(self, payload):
+        return payload
+
+
+class EchoChannel(Channel):
+    """ Server side of the channel-per-request pattern """
+
+    def data_received(self, data):
+        self.write_data(data)
+        self.close()
+
+
+class RequestChannel(Channel):
+    """ Client side of the channel-per-request pattern """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.response = asyncio.get_event_loop().create_future()
+
+    def data_received(self, data):
+        if not self.response.done():
+            self.response.set_result(data)
+
+
+class ClientProtocol(TCPChanClientProtocol):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ready = asyncio.get_event_loop().create_future()
+
+    def handshake_success(self):
+        self.ready.set_result(None)
+
+
+async def connect(loop, server_channel, client_channel):
+    server = await loop.create_server(
+        lambda: TCPChanServerProtocol(server_channel), host="127.0.0.1", port=0
+    )
+    port = server.sockets[0].getsockname()[1]
+
+    _, protocol = await loop.create_connection(
+        lambda: ClientProtocol(client_channel), host="127.0.0.1", port=port
+    )
+    await protocol.ready
+
+    return server, protocol
+
+
+async def run_batches(requests, concurrency, request):
+    for _ in range(requests // concurrency):
+        await asyncio.gather(*(request() for _ in range(concurrency)))
+
+
+async def bench_channel_per_request(loop, requests, concurrency, payload):
+    server, protocol = await connect(loop, EchoChannel, RequestChannel)
+
+    async def request():
+        channel = protocol.create_channel(data=payload, fin=True)
+        await channel.response
+
+    start = time.perf_counter()
+    await run_batches(requests, concurrency, request)
+    elapsed = time.perf_counter() - start
+
+    server.close()
+    return elapsed
+
+
+async def bench_rpc(loop, requests, concurrency, payload):
+    server, protocol = await connect(loop, EchoRPCChannel, EchoRPCChannel)
+    channel = protocol.create_channel()
+
+    start = time.perf_counter()
+    await run_batches(requests, concurrency, lambda: channel.call(payload))
+    elapsed = time.perf_counter() - start
+
+    server.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--requests", type=int, default=20000)
+    parser.add_argument("-c", "--concurrency", type=int, default=100)
+    parser.add_argument("-s", "--size", type=int, default=128)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    payload = b"x" * args.size
+
+    for name, bench in (
+        ("channel-per-request", bench_channel_per_request),
+        ("rpc", bench_rpc),
+    ):
+        elapsed = loop.run_until_complete(
+            bench(loop, args.requests, args.concurrency, payload)
+        )
+        print(f"{name:>20}: {args.requests / elapsed:10.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+""" Build script for the optional C speedups
+
+    The extension is optional: when it cannot be built, TCPChan falls back to
+    the pure-Python frame codec.
+"""
+
+from setuptools import Extension
+
+
+extensions = [
+    Extension(
+        "tcpchan.core._speedups", sources=["tcpchan/core/_speedups.c"], optional=True
+    )
+]
+
+
+def build(setup_kwargs):
+    setup_kwargs.update({"ext_modules": extensions})
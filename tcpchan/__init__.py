@@ -9,3 +9,15 @@ __version__ = "0.1.1"
 __author__ = "Frank Chang"
 __author_email__ = "frank@csie.io"
 __license__ = "BSD"
+
+_submodules = ("aio", "core", "tools")
+
+
+def __getattr__(name):
+    # Submodules are imported on first access
+    if name in _submodules:
+        import importlib
+
+        return importlib.import_module(f"{__name__}.{name}")
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,36 @@
-from .proto import *
+import importlib
 
 
-__all__ = proto.__all__
+# Submodules are imported on first access of their attributes
+_submodule_attrs = {
+    "proto": ("TCPChanClientProtocol", "TCPChanServerProtocol"),
+    "rpc": ("RPCChannel", "RPCError"),
+}
+
+_lazy_attrs = {
+    attr: submodule for submodule, attrs in _submodule_attrs.items() for attr in attrs
+}
+
+_submodules = ("proto", "rpc")
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module(f"{__name__}.{name}")
+
+    try:
+        submodule = _lazy_attrs[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    value = getattr(importlib.import_module(f"{__name__}.{submodule}"), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+__all__ = [attr for attrs in _submodule_attrs.values() for attr in attrs]
@@ -1,30 +1,58 @@
 #!/usr/bin/env python
 
 import asyncio
+import collections
 import logging
+import mmap
 
 from tcpchan.core.conn import ClientConnection
 from tcpchan.core.conn import ServerConnection
 from tcpchan.core.evt import ChannelClosed
 from tcpchan.core.evt import ChannelCreated
 from tcpchan.core.evt import DataTransmit
+from tcpchan.core.evt import FileTransmit
 from tcpchan.core.evt import HandshakeFailed
 from tcpchan.core.evt import HandshakeSuccess
+from tcpchan.core.evt import ProtocolError
+from tcpchan.core.evt import VectorTransmit
 
 
-class TCPChanBaseProtocol(asyncio.Protocol):
+RECV_BUFFER_SIZE = 64 * 1024
+RECV_BUFFER_MIN_SIZE = 4 * 1024
+RECV_BUFFER_MAX_SIZE = 1024 * 1024
+RECV_SHRINK_READS = 16
+
+
+class TCPChanBaseProtocol(asyncio.BufferedProtocol):
     """ TCP Channel Base Protocol
 
         Base protocol for the TCPChannelServerProtocol and TCPChannelClientProtocol
 
+        Data is received into a reusable buffer, which grows while reads fill it
+        or a pending frame does not fit, and shrinks after a run of small reads.
+        Events produced by a read are processed once all of its frames are parsed,
+        so that the frames transmitted in response are written together.
+
         Attributes:
             channel_factory (callable): a factory function to create new channel.
             logger (logging.Logger): optional, logging utility
             handshake_magic (int): optional, magic number to use during handshake
+            trace (TraceWriter): optional, recorder of the inbound byte stream
+            max_frame_length (int): optional, frames longer than this are rejected
+            channel_pool_size (int): optional, maximum number of closed channels
+                                     kept for reuse, pooling is disabled if zero
     """
 
     def __init__(
-        self, channel_factory, logger=None, handshake_magic=None, *args, **kwargs
+        self,
+        channel_factory,
+        logger=None,
+        handshake_magic=None,
+        trace=None,
+        max_frame_length=None,
+        channel_pool_size=0,
+        *args,
+        **kwargs,
     ):
         super().__init__(*args, **kwargs)
 
@@ -38,8 +66,38 @@ class TCPChanBaseProtocol(asyncio.Protocol):
 
         self._handshake_magic = handshake_magic
         self._channel_factory = channel_factory
+        self._trace = trace
+        self._max_frame_length = max_frame_length
+        self._channel_pool_size = channel_pool_size
+        self._write_backlog = None
+        self._backlog_task = None
+        self._drain_waiter = None
+        self._deferred = False
+
+        self._recv_size = RECV_BUFFER_SIZE
+        self._recv_buf = memoryview(bytearray(self._recv_size))
+        self._small_reads = 0
+
+    @property
+    def recv_buffer_size(self):
+        """ Current size of the receive buffer
+        """
+        return self._recv_size
 
     def _event_handler(self):
+        if self._deferred:
+            # Events are processed by the ongoing read or event handler
+            return
+
+        self._deferred = True
+        try:
+            self._process_events()
+        finally:
+            self._deferred = False
+
+    def _process_events(self):
+        writes = []
+
         while True:
             ev = self._tcpchan.next_event()
             self._logger.debug("Event %s received.", ev)
@@ -47,8 +105,33 @@ class TCPChanBaseProtocol(asyncio.Protocol):
             if ev is None:
                 break
 
+            if self._write_backlog is not None and type(ev) in (
+                DataTransmit,
+                VectorTransmit,
+                FileTransmit,
+            ):
+                # Preserve ordering of the frames while a file is being transmitted
+                self._write_backlog.append(ev)
+                continue
+
             if type(ev) == DataTransmit:
-                self._transport.write(ev.payload)
+                writes.append(ev.payload)
+                continue
+
+            if type(ev) == VectorTransmit:
+                writes += ev.buffers
+                continue
+
+            # Flush pending frames before starting file transmission or calling
+            # back, which may close the transport
+            if writes:
+                self._transport.writelines(writes)
+                writes = []
+
+            if type(ev) == FileTransmit:
+                self._write_backlog = collections.deque([ev])
+                self._backlog_task = asyncio.ensure_future(self._transmit_backlog())
+                self._backlog_task.add_done_callback(self._backlog_done)
 
             elif type(ev) == ChannelCreated:
                 self.channel_created(ev.channel)
@@ -62,28 +145,185 @@ class TCPChanBaseProtocol(asyncio.Protocol):
             elif type(ev) == HandshakeFailed:
                 self.handshake_failed(self, reason=ev.reason)
 
+            elif type(ev) == ProtocolError:
+                self.protocol_error(ev.reason)
+
+        if writes:
+            self._transport.writelines(writes)
+
+    async def _transmit_backlog(self):
+        try:
+            while self._write_backlog:
+                ev = self._write_backlog.popleft()
+                if type(ev) == FileTransmit:
+                    try:
+                        await self._transmit_file(ev)
+                    finally:
+                        self._release_file(ev)
+                elif type(ev) == VectorTransmit:
+                    self._transport.writelines(ev.buffers)
+                else:
+                    self._transport.write(ev.payload)
+        except Exception:
+            self._logger.exception("File transmission failed.")
+            self._transport.close()
+        finally:
+            self._discard_backlog()
+
+    def _backlog_done(self, task):
+        # A task cancelled before it started has not discarded its backlog
+        if task is self._backlog_task:
+            self._discard_backlog()
+
+    def _discard_backlog(self):
+        for ev in self._write_backlog:
+            if type(ev) == FileTransmit:
+                self._release_file(ev)
+
+        self._write_backlog = None
+        self._backlog_task = None
+
+    def _release_file(self, ev):
+        if ev.closefd:
+            ev.file.close()
+
+    async def _transmit_file(self, ev):
+        if self._transport.get_extra_info("sslcontext") is None:
+            loop = asyncio.get_event_loop()
+            for header, offset, count in ev.segments:
+                self._transport.write(header)
+                sent = await loop.sendfile(self._transport, ev.file, offset, count)
+
+                if sent != count:
+                    # The frame header announced more, framing is broken
+                    raise EOFError(f"Short file transmission, {sent}/{count} bytes.")
+
+            return
+
+        # sendfile is not applicable to TLS transports, fall back to chunked reads
+        try:
+            content = mmap.mmap(ev.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError):
+            content = None
+
+        try:
+            for header, offset, count in ev.segments:
+                if content is not None:
+                    chunk = content[offset : offset + count]
+                else:
+                    ev.file.seek(offset)
+                    chunk = ev.file.read(count)
+
+                if len(chunk) != count:
+                    raise EOFError(
+                        f"Short file transmission, {len(chunk)}/{count} bytes."
+                    )
+
+                self._transport.writelines([header, chunk])
+                await self._drain()
+        finally:
+            if content is not None:
+                content.close()
+
+    async def _drain(self):
+        if self._drain_waiter is not None:
+            await self._drain_waiter
+
+        if self._transport.is_closing():
+            raise ConnectionResetError("Connection lost.")
+
+    def pause_writing(self):
+        self._drain_waiter = asyncio.get_event_loop().create_future()
+
+    def resume_writing(self):
+        if self._drain_waiter is not None and not self._drain_waiter.done():
+            self._drain_waiter.set_result(None)
+
+        self._drain_waiter = None
+
     def connection_made(self, transport):
         self._transport = transport
         self._tcpchan.connection_established()
 
+    def connection_lost(self, exc):
+        if self._backlog_task is not None:
+            self._backlog_task.cancel()
+
+        self.resume_writing()
+
+    def get_buffer(self, sizehint):
+        return self._recv_buf
+
+    def buffer_updated(self, nbytes):
+        self.data_received(self._recv_buf[:nbytes])
+        self._adapt_recv_buffer(nbytes)
+
     def data_received(self, data):
-        data = memoryview(data)
-        self._tcpchan.data_received(data)
+        if self._trace is not None:
+            self._trace.record(data)
+
+        # Process the events once all frames of the read are parsed
+        deferred, self._deferred = self._deferred, True
+        try:
+            self._tcpchan.data_received(memoryview(data))
+        finally:
+            self._deferred = deferred
+
+        self._event_handler()
+
+    def _adapt_recv_buffer(self, nbytes):
+        size = self._recv_size
+
+        if nbytes == size:
+            # More data is likely pending in the socket
+            size *= 2
+            self._small_reads = 0
+        elif nbytes < size // 4:
+            self._small_reads += 1
+            if self._small_reads >= RECV_SHRINK_READS:
+                size //= 2
+                self._small_reads = 0
+        else:
+            self._small_reads = 0
+
+        # Receive the rest of a pending frame in a single read
+        while size < self._tcpchan.needed:
+            size *= 2
 
-    def create_channel(self):
+        size = min(max(size, RECV_BUFFER_MIN_SIZE), RECV_BUFFER_MAX_SIZE)
+        if size != self._recv_size:
+            self._recv_size = size
+            self._recv_buf = memoryview(bytearray(size))
+
+    def create_channel(self, data=None, fin=False):
         """ Create new channel
 
             Calling this method creates a logical transmssion channel, and
             send a channel creation request to the other end of the connection.
 
+            Arguments:
+                data (bytes): optional, first payload sent along with the request
+                fin (bool): optional, indicate no more data will be sent on the channel
+
             Returns:
                 new_channel (Channel): Newly created channel
+
+            Raises:
+                ValueError: the first payload is too large
         """
-        new_channel = self._tcpchan.create_channel()
+        new_channel = self._tcpchan.create_channel(data=data, fin=fin)
         self._logger.debug("Channel %d is created.", new_channel.channel_id)
 
         return new_channel
 
+    def transmit_many(self, items):
+        """ Transmit data of multiple channels at once
+
+            Arguments:
+                items (iterable): ```(channel_id, data)``` tuples
+        """
+        self._tcpchan.transmit_many(items)
+
     def handshake_success(self):
         """ Called when handshake success
         """
@@ -95,6 +335,16 @@ class TCPChanBaseProtocol(asyncio.Protocol):
                 reason (str): reason of handshake failure
         """
 
+    def protocol_error(self, reason):
+        """ Called when malformed data is received
+
+            The connection is closed by default.
+
+            Arguments:
+                reason (str): description of the error
+        """
+        self._transport.close()
+
     def channel_created(self, channel):
         """ Called when channel is created from the other end of the connection
 
@@ -119,6 +369,10 @@ class TCPChanServerProtocol(TCPChanBaseProtocol):
             channel_factory (callable): a factory function to create new channel.
             logger (logging.Logger): optional, logging utility
             handshake_magic (int): optional, magic number to use during handshake
+            trace (TraceWriter): optional, recorder of the inbound byte stream
+            max_frame_length (int): optional, frames longer than this are rejected
+            channel_pool_size (int): optional, maximum number of closed channels
+                                     kept for reuse, pooling is disabled if zero
     """
 
     def __init__(self, *args, **kwargs):
@@ -127,6 +381,8 @@ class TCPChanServerProtocol(TCPChanBaseProtocol):
             self._channel_factory,
             event_callback=self._event_handler,
             handshake_magic=self._handshake_magic,
+            max_frame_length=self._max_frame_length,
+            channel_pool_size=self._channel_pool_size,
         )
 
 
@@ -139,6 +395,10 @@ class TCPChanClientProtocol(TCPChanBaseProtocol):
             channel_factory (callable): a factory function to create new channel.
             logger (logging.Logger): optional, logging utility
             handshake_magic (int): optional, magic number to use during handshake
+            trace (TraceWriter): optional, recorder of the inbound byte stream
+            max_frame_length (int): optional, frames longer than this are rejected
+            channel_pool_size (int): optional, maximum number of closed channels
+                                     kept for reuse, pooling is disabled if zero
     """
 
     def __init__(self, *args, **kwargs):
@@ -147,6 +407,8 @@ class TCPChanClientProtocol(TCPChanBaseProtocol):
             self._channel_factory,
             event_callback=self._event_handler,
             handshake_magic=self._handshake_magic,
+            max_frame_length=self._max_frame_length,
+            channel_pool_size=self._channel_pool_size,
         )
 
 
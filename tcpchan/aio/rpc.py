@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+import asyncio
+
+from tcpchan.core.chan import Channel
+from tcpchan.core.codec import TCPCHAN_MAX_PAYLOAD_SIZE
+from tcpchan.core.rpc import RPC_KIND_ERROR
+from tcpchan.core.rpc import RPC_KIND_REQUEST
+from tcpchan.core.rpc import RPC_KIND_RESPONSE
+from tcpchan.core.rpc import RPCDecoder
+from tcpchan.core.rpc import encode_rpc_message
+
+
+class RPCError(Exception):
+    """ Raised when the remote request handler failed
+    """
+
+
+class RPCChannel(Channel):
+    """ RPC Channel
+
+        Request/response channel which multiplexes calls over a single long-lived
+        channel. Each request carries a correlation id, so multiple calls can be
+        pipelined and their responses may arrive in any order.
+
+        Incoming requests are passed to ```request_received```, which should be
+        overridden to produce the response.
+
+        Attributes:
+            max_in_flight (int): optional, maximum number of concurrent calls
+            timeout (float): optional, default timeout of calls in seconds
+            max_message_size (int): optional, maximum size of a message payload
+    """
+
+    def __init__(
+        self, *args, max_in_flight=None, timeout=None, max_message_size=None, **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+
+        if max_message_size is None:
+            self._decoder = RPCDecoder()
+        else:
+            self._decoder = RPCDecoder(max_message_size=max_message_size)
+
+        self._max_in_flight = max_in_flight
+        self._in_flight = None
+        self._timeout = timeout
+        self._pending = {}
+        self._request_tasks = set()
+        self._next_id = 0
+
+        # Incremented on close, so that calls queued before are not sent on
+        # the channel once it is reused
+        self._generation = 0
+
+    async def call(self, payload, timeout=None):
+        """ Send a request and wait for its response
+
+            Arguments:
+                payload (bytes): request payload
+                timeout (float): optional, timeout of the call in seconds,
+                                 overrides the default timeout of the channel
+
+            Returns:
+                response (bytes): response payload
+
+            Raises:
+                RPCError: the remote request handler failed
+                asyncio.TimeoutError: no response within timeout
+                ConnectionError: the channel is closed
+        """
+        if timeout is None:
+            timeout = self._timeout
+
+        generation = self._generation
+
+        if self._max_in_flight is None:
+            return await self._call(payload, timeout, generation)
+
+        if self._in_flight is None:
+            self._in_flight = asyncio.Semaphore(self._max_in_flight)
+
+        async with self._in_flight:
+            return await self._call(payload, timeout, generation)
+
+    async def _call(self, payload, timeout, generation):
+        if self._closed or generation != self._generation:
+            raise ConnectionError("RPC channel is closed.")
+
+        correlation_id = self._allocate_id()
+        fut = asyncio.get_event_loop().create_future()
+        self._pending[correlation_id] = fut
+
+        try:
+            self._send(RPC_KIND_REQUEST, correlation_id, payload)
+            return await asyncio.wait_for(fut, timeout)
+        finally:
+            if self._pending.get(correlation_id) is fut:
+                del self._pending[correlation_id]
+
+    def _allocate_id(self):
+        while True:
+            correlation_id = self._next_id
+            self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+
+            if correlation_id not in self._pending:
+                return correlation_id
+
+    def _send(self, kind, correlation_id, payload):
+        data = memoryview(encode_rpc_message(kind, correlation_id, payload))
+
+        for offset in range(0, len(data), TCPCHAN_MAX_PAYLOAD_SIZE):
+            self.write_data(data[offset : offset + TCPCHAN_MAX_PAYLOAD_SIZE])
+
+    def data_received(self, data):
+        try:
+            messages = self._decoder.feed(data)
+        except ValueError as e:
+            self._logger.error("Malformed RPC message: %s", e)
+            self.close()
+            return
+
+        for kind, correlation_id, payload in messages:
+            if kind == RPC_KIND_REQUEST:
+                self._handle_request(correlation_id, payload)
+            elif kind in (RPC_KIND_RESPONSE, RPC_KIND_ERROR):
+                self._handle_response(kind, correlation_id, payload)
+            else:
+                self._logger.error("Unknown RPC message kind %d.", kind)
+
+    def _handle_request(self, correlation_id, payload):
+        try:
+            result = self.request_received(payload)
+        except Exception as e:
+            self._reply_error(correlation_id, e)
+            return
+
+        if not asyncio.iscoroutine(result) and not asyncio.isfuture(result):
+            self._reply(correlation_id, result)
+            return
+
+        task = asyncio.ensure_future(result)
+        self._request_tasks.add(task)
+        task.add_done_callback(lambda t: self._request_done(correlation_id, t))
+
+    def _request_done(self, correlation_id, task):
+        try:
+            self._request_tasks.remove(task)
+        except KeyError:
+            # Cancelled on close, the channel may already be reused
+            return
+
+        if task.cancelled():
+            self._reply_error(correlation_id, asyncio.CancelledError())
+        elif task.exception() is not None:
+            self._reply_error(correlation_id, task.exception())
+        else:
+            self._reply(correlation_id, task.result())
+
+    def _reply(self, correlation_id, response):
+        if self._closed:
+            return
+
+        self._send(RPC_KIND_RESPONSE, correlation_id, response or b"")
+
+    def _reply_error(self, correlation_id, exc):
+        self._logger.debug("RPC request %d failed: %r", correlation_id, exc)
+
+        if self._closed:
+            return
+
+        reason = str(exc) or type(exc).__name__
+        self._send(RPC_KIND_ERROR, correlation_id, reason.encode("utf-8"))
+
+    def _handle_response(self, kind, correlation_id, payload):
+        fut = self._pending.get(correlation_id)
+
+        if fut is None or fut.done():
+            self._logger.debug("Dropping response of unknown call %d.", correlation_id)
+            return
+
+        if kind == RPC_KIND_ERROR:
+            fut.set_exception(RPCError(payload.decode("utf-8", errors="replace")))
+        else:
+            fut.set_result(payload)
+
+    def request_received(self, payload):
+        """ Called on reception of a request
+
+            The returned value is sent back as response. The method can also be
+            a coroutine function, in which case the response is sent once the
+            coroutine finishes. Raising an exception replies with an error,
+            which is raised as ```RPCError``` at the caller.
+
+            Arguments:
+                payload (bytes): request payload
+
+            Returns:
+                response (bytes): response payload
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        super().reset()
+        self._decoder.reset()
+        self._pending.clear()
+        self._cancel_requests()
+        self._in_flight = None
+        self._next_id = 0
+
+    def close(self):
+        """ Close the channel
+
+            Outstanding calls, including the ones waiting for ```max_in_flight```,
+            are failed with ```ConnectionError```, and requests still being
+            handled are cancelled.
+        """
+        super().close()
+        self._generation += 1
+
+        for fut in self._pending.values():
+            if not fut.done():
+                fut.set_exception(ConnectionError("RPC channel is closed."))
+
+        self._pending.clear()
+        self._cancel_requests()
+
+    def _cancel_requests(self):
+        tasks, self._request_tasks = self._request_tasks, set()
+        for task in tasks:
+            task.cancel()
+
+
+__all__ = ["RPCChannel", "RPCError"]
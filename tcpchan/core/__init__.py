@@ -1,6 +1,49 @@
-from .chan import *
-from .conn import *
-from .msg import *
+import importlib
 
 
-__all__ = chan.__all__ + msg.__all__ + conn.__all__
+# Submodules are imported on first access of their attributes
+_submodule_attrs = {
+    "buf": ("SpillBuffer",),
+    "chan": ("Channel", "BufferedChannel"),
+    "msg": (
+        "TCPChanMessage",
+        "HandshakeRequest",
+        "HandshakeReply",
+        "CreateChannelRequest",
+        "CloseChannelRequest",
+        "ChannelPayload",
+        "CreateChannelWithPayload",
+        "ChannelDatagram",
+    ),
+    "conn": ("Connection", "ClientConnection", "ServerConnection"),
+    "group": ("ChannelGroup",),
+    "rpc": ("RPCDecoder", "encode_rpc_message"),
+}
+
+_lazy_attrs = {
+    attr: submodule for submodule, attrs in _submodule_attrs.items() for attr in attrs
+}
+
+_submodules = ("buf", "chan", "codec", "conn", "evt", "group", "msg", "rpc")
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module(f"{__name__}.{name}")
+
+    try:
+        submodule = _lazy_attrs[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    value = getattr(importlib.import_module(f"{__name__}.{submodule}"), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+__all__ = [attr for attrs in _submodule_attrs.values() for attr in attrs]
@@ -0,0 +1,253 @@
+/*
+ * TCPChan frame codec speedups
+ *
+ * C implementation of the hot paths of tcpchan.core.codec. The functions
+ * must behave exactly like their pure-Python counterparts.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#define TCPCHAN_VERSION 0
+
+#define OP_HANDSHAKE_REQUEST 1
+#define OP_HANDSHAKE_REPLY 2
+#define OP_CREATE_CHANNEL_REQUEST 3
+#define OP_CLOSE_CHANNEL_REQUEST 4
+#define OP_CHANNEL_PAYLOAD 5
+#define OP_CREATE_CHANNEL_WITH_PAYLOAD 6
+#define OP_CHANNEL_DATAGRAM 7
+
+#define FRAME_PREFIX_SIZE 2
+#define IDENT_FRAME_SIZE 6
+#define CHANNEL_PAYLOAD_HEADER_SIZE 8
+#define FLAGGED_PAYLOAD_HEADER_SIZE 9
+
+static PyObject *StructError = NULL;
+
+static unsigned long
+read_u32(const unsigned char *p)
+{
+    return ((unsigned long)p[0] << 24) | ((unsigned long)p[1] << 16) |
+           ((unsigned long)p[2] << 8) | (unsigned long)p[3];
+}
+
+static Py_ssize_t
+read_u16(const unsigned char *p)
+{
+    return ((Py_ssize_t)p[0] << 8) | (Py_ssize_t)p[1];
+}
+
+static int
+append_frame(PyObject *frames, int op, unsigned long ident, int flags,
+             const unsigned char *payload, Py_ssize_t size)
+{
+    PyObject *frame, *payload_obj;
+    int ret;
+
+    if (payload == NULL) {
+        Py_INCREF(Py_None);
+        payload_obj = Py_None;
+    }
+    else {
+        payload_obj = PyBytes_FromStringAndSize((const char *)payload, size);
+        if (payload_obj == NULL)
+            return -1;
+    }
+
+    frame = Py_BuildValue("(ikiN)", op, ident, flags, payload_obj);
+    if (frame == NULL)
+        return -1;
+
+    ret = PyList_Append(frames, frame);
+    Py_DECREF(frame);
+    return ret;
+}
+
+PyDoc_STRVAR(decode_frames_doc,
+"decode_frames(data) -> (frames, processed)\n\n"
+"Decode complete frames from buffered data. Decoding stops at the first\n"
+"incomplete frame or unknown opcode.");
+
+static PyObject *
+decode_frames(PyObject *module, PyObject *data)
+{
+    Py_buffer view;
+    const unsigned char *buf;
+    Py_ssize_t length, offset = 0, size, start;
+    PyObject *frames;
+    int op;
+
+    if (PyObject_GetBuffer(data, &view, PyBUF_SIMPLE) < 0)
+        return NULL;
+
+    frames = PyList_New(0);
+    if (frames == NULL) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    buf = (const unsigned char *)view.buf;
+    length = view.len;
+
+    while (length - offset >= FRAME_PREFIX_SIZE) {
+        op = buf[offset + 1];
+
+        switch (op) {
+        case OP_HANDSHAKE_REQUEST:
+        case OP_HANDSHAKE_REPLY:
+        case OP_CREATE_CHANNEL_REQUEST:
+        case OP_CLOSE_CHANNEL_REQUEST:
+            if (length - offset < IDENT_FRAME_SIZE)
+                goto done;
+
+            if (append_frame(frames, op, read_u32(buf + offset + 2), 0,
+                             NULL, 0) < 0)
+                goto error;
+
+            offset += IDENT_FRAME_SIZE;
+            break;
+
+        case OP_CHANNEL_PAYLOAD:
+            if (length - offset < CHANNEL_PAYLOAD_HEADER_SIZE)
+                goto done;
+
+            size = read_u16(buf + offset + 6);
+            start = offset + CHANNEL_PAYLOAD_HEADER_SIZE;
+            if (start + size > length)
+                goto done;
+
+            if (append_frame(frames, op, read_u32(buf + offset + 2), 0,
+                             buf + start, size) < 0)
+                goto error;
+
+            offset = start + size;
+            break;
+
+        case OP_CREATE_CHANNEL_WITH_PAYLOAD:
+        case OP_CHANNEL_DATAGRAM:
+            if (length - offset < FLAGGED_PAYLOAD_HEADER_SIZE)
+                goto done;
+
+            size = read_u16(buf + offset + 7);
+            start = offset + FLAGGED_PAYLOAD_HEADER_SIZE;
+            if (start + size > length)
+                goto done;
+
+            if (append_frame(frames, op, read_u32(buf + offset + 2),
+                             buf[offset + 6], buf + start, size) < 0)
+                goto error;
+
+            offset = start + size;
+            break;
+
+        default:
+            goto done;
+        }
+    }
+
+done:
+    PyBuffer_Release(&view);
+    return Py_BuildValue("(Nn)", frames, offset);
+
+error:
+    PyBuffer_Release(&view);
+    Py_DECREF(frames);
+    return NULL;
+}
+
+PyDoc_STRVAR(encode_channel_payload_doc,
+"encode_channel_payload(channel_id, payload) -> bytes\n\n"
+"Encode a channel payload frame.");
+
+static PyObject *
+encode_channel_payload(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    Py_buffer view;
+    unsigned long channel_id;
+    unsigned char *out;
+    PyObject *result;
+
+    if (nargs != 2) {
+        PyErr_Format(PyExc_TypeError,
+                     "encode_channel_payload() takes exactly 2 arguments "
+                     "(%zd given)", nargs);
+        return NULL;
+    }
+
+    if (!PyLong_Check(args[0])) {
+        PyErr_SetString(StructError, "required argument is not an integer");
+        return NULL;
+    }
+
+    channel_id = PyLong_AsUnsignedLong(args[0]);
+    if ((channel_id == (unsigned long)-1 && PyErr_Occurred()) ||
+        channel_id > 0xFFFFFFFFUL) {
+        PyErr_Clear();
+        PyErr_SetString(StructError,
+                        "argument out of range for channel id");
+        return NULL;
+    }
+
+    if (PyObject_GetBuffer(args[1], &view, PyBUF_SIMPLE) < 0)
+        return NULL;
+
+    if (view.len > 0xFFFF) {
+        PyBuffer_Release(&view);
+        PyErr_SetString(StructError, "'H' format requires 0 <= number <= 65535");
+        return NULL;
+    }
+
+    result = PyBytes_FromStringAndSize(NULL,
+                                       CHANNEL_PAYLOAD_HEADER_SIZE + view.len);
+    if (result == NULL) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    out = (unsigned char *)PyBytes_AS_STRING(result);
+    out[0] = TCPCHAN_VERSION;
+    out[1] = OP_CHANNEL_PAYLOAD;
+    out[2] = (unsigned char)(channel_id >> 24);
+    out[3] = (unsigned char)(channel_id >> 16);
+    out[4] = (unsigned char)(channel_id >> 8);
+    out[5] = (unsigned char)channel_id;
+    out[6] = (unsigned char)(view.len >> 8);
+    out[7] = (unsigned char)view.len;
+    memcpy(out + CHANNEL_PAYLOAD_HEADER_SIZE, view.buf, view.len);
+
+    PyBuffer_Release(&view);
+    return result;
+}
+
+static PyMethodDef speedups_methods[] = {
+    {"decode_frames", (PyCFunction)decode_frames, METH_O, decode_frames_doc},
+    {"encode_channel_payload", (PyCFunction)(void (*)(void))encode_channel_payload,
+     METH_FASTCALL, encode_channel_payload_doc},
+    {NULL, NULL, 0, NULL},
+};
+
+static struct PyModuleDef speedups_module = {
+    PyModuleDef_HEAD_INIT,
+    "tcpchan.core._speedups",
+    "C implementation of the TCPChan frame codec hot paths.",
+    -1,
+    speedups_methods,
+};
+
+PyMODINIT_FUNC
+PyInit__speedups(void)
+{
+    PyObject *struct_module;
+
+    struct_module = PyImport_ImportModule("struct");
+    if (struct_module == NULL)
+        return NULL;
+
+    StructError = PyObject_GetAttrString(struct_module, "error");
+    Py_DECREF(struct_module);
+    if (StructError == NULL)
+        return NULL;
+
+    return PyModule_Create(&speedups_module);
+}
@@ -0,0 +1,134 @@
+import mmap
+import tempfile
+
+
+SPILL_THRESHOLD = 4 * 1024 * 1024
+
+
+class SpillBuffer:
+    """ Spill-to-disk Buffer
+
+        FIFO byte buffer which keeps data in memory up to a threshold. Beyond the
+        threshold, buffered data is spilled to a memory-mapped temporary file, which
+        is released once the buffer is drained.
+
+        Attributes:
+            threshold (int): optional, size in bytes above which data is spilled
+    """
+
+    def __init__(self, threshold=SPILL_THRESHOLD):
+        self._threshold = threshold
+        self._mem = bytearray()
+        self._file = None
+        self._map = None
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        if self._map is None:
+            return len(self._mem)
+
+        return self._end - self._start
+
+    @property
+    def spilled(self):
+        """ Tell whether buffered data is spilled to disk or not
+        """
+        return self._map is not None
+
+    def write(self, data):
+        """ Append data to the buffer
+
+            Arguments:
+                data (bytes): data to append
+        """
+        if self._map is None:
+            if len(self._mem) + len(data) <= self._threshold:
+                self._mem += data
+                return
+
+            self._spill()
+
+        self._reserve(len(data))
+        self._map[self._end : self._end + len(data)] = data
+        self._end += len(data)
+
+    def read(self, size=-1):
+        """ Read data from the buffer
+
+            Arguments:
+                size (int): optional, maximum number of bytes to read,
+                            read all buffered data if negative
+
+            Returns:
+                data (bytes): data read from the buffer
+        """
+        if size < 0 or size > len(self):
+            size = len(self)
+
+        if self._map is None:
+            data = bytes(self._mem[:size])
+            del self._mem[:size]
+            return data
+
+        data = self._map[self._start : self._start + size]
+        self._start += size
+
+        if self._start == self._end:
+            self._release()
+
+        return data
+
+    def close(self):
+        """ Discard buffered data and release the underlying file
+        """
+        self._mem = bytearray()
+        self._release()
+
+    def _spill(self):
+        self._file = tempfile.TemporaryFile()
+        self._resize(max(mmap.PAGESIZE, 2 * self._threshold))
+        self._map[: len(self._mem)] = self._mem
+        self._start = 0
+        self._end = len(self._mem)
+        self._mem = bytearray()
+
+    def _reserve(self, size):
+        if self._end + size <= len(self._map):
+            return
+
+        # Reclaim the space of data already read before growing the file
+        pending = self._end - self._start
+        if self._start > 0:
+            self._map.move(0, self._start, pending)
+            self._start = 0
+            self._end = pending
+
+        if pending + size <= len(self._map):
+            return
+
+        capacity = len(self._map)
+        while capacity < pending + size:
+            capacity *= 2
+
+        self._resize(capacity)
+
+    def _resize(self, capacity):
+        if self._map is not None:
+            self._map.close()
+
+        self._file.truncate(capacity)
+        self._map = mmap.mmap(self._file.fileno(), capacity)
+
+    def _release(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+
+        self._map = None
+        self._file = None
+        self._start = 0
+        self._end = 0
+
+
+__all__ = ["SpillBuffer"]
@@ -1,5 +1,11 @@
 import logging
 
+from tcpchan.core.buf import SPILL_THRESHOLD
+from tcpchan.core.buf import SpillBuffer
+
+
+CHANNEL_MAX_MESSAGE_SIZE = 1024 * 1024
+
 
 class Channel:
     """ TCPChan Channel
@@ -11,12 +17,27 @@ class Channel:
             connection (TCPChan.core.Connection): associated TCPChan connection
             channel_id (int): id of the channel
             logger (logging.Logger): logging utility
+            message_mode (bool): optional, deliver each ```write_data``` as one message
+            max_message_size (int): optional, maximum size of a channel message
     """
 
-    def __init__(self, connection=None, channel_id=0, logger=None):
+    def __init__(
+        self,
+        connection=None,
+        channel_id=0,
+        logger=None,
+        message_mode=False,
+        max_message_size=CHANNEL_MAX_MESSAGE_SIZE,
+    ):
         self._channel_id = channel_id
         self._conn = connection
         self._closed = False
+        self._fin_sent = False
+        self._message_mode = message_mode
+        self._max_message_size = max_message_size
+        self._fragments = []
+        self._fragments_size = 0
+        self._close_callbacks = []
 
         if logger:
             self._logger = logger
@@ -31,6 +52,14 @@ class Channel:
     def connection(self):
         return self._conn
 
+    @property
+    def message_mode(self):
+        return self._message_mode
+
+    @property
+    def max_message_size(self):
+        return self._max_message_size
+
     def set_connection(self, connection):
         """ Associate the channel with given connection
         """
@@ -41,6 +70,39 @@ class Channel:
         """
         self._channel_id = channel_id
 
+    def set_fin_sent(self):
+        """ Mark that no more data will be sent on the channel
+
+            Further writes are dropped with a warning.
+        """
+        self._fin_sent = True
+
+    @property
+    def fin_sent(self):
+        """ Tell whether no more data will be sent on the channel
+        """
+        return self._fin_sent
+
+    def reset(self):
+        """ Reset the channel for reuse
+
+            Called before a closed channel is reused by a connection with channel
+            pooling enabled. Subclasses keeping per-channel state should extend it.
+        """
+        self._channel_id = 0
+        self._conn = None
+        self._closed = False
+        self._fin_sent = False
+        self._fragments = []
+        self._fragments_size = 0
+        self._close_callbacks = []
+
+    @property
+    def reusable(self):
+        """ Tell whether the closed channel can be pooled for reuse
+        """
+        return True
+
     def channel_created(self):
         """ Called when channel is created
         """
@@ -49,14 +111,108 @@ class Channel:
     def write_data(self, data):
         """ Send channel data to connection
 
+            In message mode, the data is delivered as a single message at the
+            other end of channel.
+
             Arguments:
                 data (bytes): data to send to the other end of channel
+
+            Raises:
+                ValueError: message exceeds the maximum message size
         """
         if self._closed:
             self._logger.warn("Writing data to a closed channel.")
             return
 
-        self._conn.channel_transmit_data(self._channel_id, data)
+        if self._fin_sent:
+            self._logger.warn("Writing data to a channel after FIN.")
+            return
+
+        if not self._message_mode:
+            self._conn.channel_transmit_data(self._channel_id, data)
+            return
+
+        if len(data) > self._max_message_size:
+            raise ValueError(
+                f"message size {len(data)} exceeds limit {self._max_message_size}."
+            )
+
+        self._conn.channel_transmit_message(self._channel_id, data)
+
+    def send_file(self, fileobj, offset=0, count=None):
+        """ Send file content to connection
+
+            The file content is transmitted by the I/O library, e.g. with
+            ```sendfile```, without being read into memory. The transmission
+            happens later, files with a file descriptor may be closed right after
+            the call since the descriptor is duplicated, other file objects must
+            be kept open until the content is transmitted.
+            The duplicated descriptor shares the file position with ```fileobj```,
+            which is undefined after the call.
+
+            The content is sent as stream payload regardless of the message mode.
+
+            Arguments:
+                fileobj (file): file opened in binary mode
+                offset (int): optional, offset of the content in the file
+                count (int): optional, number of bytes to send, defaults to
+                             the rest of the file
+
+            Raises:
+                ValueError: the range is out of the file
+        """
+        if self._closed:
+            self._logger.warn("Sending file to a closed channel.")
+            return
+
+        if self._fin_sent:
+            self._logger.warn("Sending file to a channel after FIN.")
+            return
+
+        self._conn.channel_transmit_file(self._channel_id, fileobj, offset, count)
+
+    def fragment_received(self, data, last):
+        """ Called on reception of a message fragment
+
+            Fragments are reassembled and the complete message is passed to
+            ```data_received```. The channel is closed if the message exceeds
+            the maximum message size.
+
+            Arguments:
+                data (bytes): received fragment
+                last (bool): whether the fragment is the last one of the message
+        """
+        if last and not self._fragments:
+            if len(data) > self._max_message_size:
+                self._message_too_large(len(data))
+                return
+
+            self.data_received(data)
+            return
+
+        self._fragments.append(data)
+        self._fragments_size += len(data)
+
+        if self._fragments_size > self._max_message_size:
+            self._message_too_large(self._fragments_size)
+            return
+
+        if last:
+            message = b"".join(self._fragments)
+            self._fragments = []
+            self._fragments_size = 0
+            self.data_received(message)
+
+    def _message_too_large(self, size):
+        self._logger.error(
+            "Message of size %d exceeds limit %d, closing channel %d.",
+            size,
+            self._max_message_size,
+            self._channel_id,
+        )
+        self._fragments = []
+        self._fragments_size = 0
+        self.close()
 
     def data_received(self, data):
         """ Called on reception of data
@@ -66,6 +222,11 @@ class Channel:
         """
         raise NotImplementedError
 
+    def eof_received(self):
+        """ Called when the other end of the channel will send no more data
+        """
+        self._logger.debug("Channel %d received EOF.", self._channel_id)
+
     @property
     def is_closed(self):
         """ Tell whether channel is close or not
@@ -81,5 +242,83 @@ class Channel:
             if self._conn.get_channel(self.channel_id):
                 self._conn.close_channel(self.channel_id)
 
+            callbacks, self._close_callbacks = self._close_callbacks, []
+            for callback in callbacks:
+                callback(self)
+
+    def add_close_callback(self, callback):
+        """ Add a callback to be called with the channel when it is closed
+
+            Arguments:
+                callback (callable): the callback
+        """
+        self._close_callbacks.append(callback)
+
+    def remove_close_callback(self, callback):
+        """ Remove a previously added close callback
+
+            Arguments:
+                callback (callable): the callback
+        """
+        try:
+            self._close_callbacks.remove(callback)
+        except ValueError:
+            pass
+
+
+class BufferedChannel(Channel):
+    """ TCPChan Buffered Channel
+
+        The buffered channel keeps received data until it is read by the consumer,
+        so that slow consumers can catch up later. Buffered data is kept in memory
+        up to ```spill_threshold``` and spilled to a temporary file beyond it.
+
+        Attributes:
+            spill_threshold (int): optional, size in bytes above which data is spilled
+    """
+
+    def __init__(self, *args, spill_threshold=SPILL_THRESHOLD, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._inbound = SpillBuffer(threshold=spill_threshold)
+
+    @property
+    def buffered(self):
+        """ Number of buffered bytes
+        """
+        return len(self._inbound)
+
+    def read(self, size=-1):
+        """ Read buffered data
+
+            Arguments:
+                size (int): optional, maximum number of bytes to read,
+                            read all buffered data if negative
+
+            Returns:
+                data (bytes): buffered data
+        """
+        return self._inbound.read(size)
+
+    @property
+    def reusable(self):
+        """ Tell whether the closed channel can be pooled for reuse
+
+            Channels with unread data are not pooled, so that the consumer can
+            still read it after the channel is closed.
+        """
+        return not self._inbound
+
+    def reset(self):
+        super().reset()
+        self._inbound.close()
+
+    def data_received(self, data):
+        self._inbound.write(data)
+        self.data_available()
+
+    def data_available(self):
+        """ Called when new data is buffered
+        """
+
 
-__all__ = ["Channel"]
+__all__ = ["Channel", "BufferedChannel"]
@@ -0,0 +1,299 @@
+""" TCPChan frame codec
+
+    Struct-based encoder and decoder for the TCPChan wire format. The layouts
+    match the messages defined in ```tcpchan.core.msg```. When the optional
+    ```tcpchan.core._speedups``` extension is available, it replaces the pure-Python
+    implementation of the hot paths.
+"""
+
+import struct
+
+
+TCPCHAN_VERSION = 0
+
+TCPCHAN_OP_HANDSHAKE_REQUEST = 1
+TCPCHAN_OP_HANDSHAKE_REPLY = 2
+TCPCHAN_OP_CREATE_CHANNEL_REQUEST = 3
+TCPCHAN_OP_CLOSE_CHANNEL_REQUEST = 4
+TCPCHAN_OP_CHANNEL_PAYLOAD = 5
+TCPCHAN_OP_CREATE_CHANNEL_WITH_PAYLOAD = 6
+TCPCHAN_OP_CHANNEL_DATAGRAM = 7
+
+TCPCHAN_FLAG_FIN = 0x01
+TCPCHAN_FLAG_MORE = 0x02
+
+TCPCHAN_MAX_PAYLOAD_SIZE = 0xFFFF
+
+# Version, Op
+FRAME_PREFIX = struct.Struct("!BB")
+# Version, Op, Channel/Magic
+IDENT_FRAME = struct.Struct("!BBI")
+# Version, Op, Channel, Payload length
+CHANNEL_PAYLOAD_HEADER = struct.Struct("!BBIH")
+# Version, Op, Channel, Flags, Payload length
+FLAGGED_PAYLOAD_HEADER = struct.Struct("!BBIBH")
+
+TCPCHAN_MAX_FRAME_LENGTH = FLAGGED_PAYLOAD_HEADER.size + TCPCHAN_MAX_PAYLOAD_SIZE
+
+_IDENT_OPS = frozenset(
+    (
+        TCPCHAN_OP_HANDSHAKE_REQUEST,
+        TCPCHAN_OP_HANDSHAKE_REPLY,
+        TCPCHAN_OP_CREATE_CHANNEL_REQUEST,
+        TCPCHAN_OP_CLOSE_CHANNEL_REQUEST,
+    )
+)
+_FLAGGED_OPS = frozenset(
+    (TCPCHAN_OP_CREATE_CHANNEL_WITH_PAYLOAD, TCPCHAN_OP_CHANNEL_DATAGRAM)
+)
+
+
+def frame_length(data, offset=0):
+    """ Get the length of the frame starting at offset
+
+        Arguments:
+            data (bytes, bytearray, memoryview): buffered data
+            offset (int): optional, offset of the frame
+
+        Returns:
+            length (int): length of the frame, or None if the header is incomplete
+
+        Raises:
+            ValueError: unknown opcode
+    """
+    available = len(data) - offset
+    if available < FRAME_PREFIX.size:
+        return None
+
+    op = data[offset + 1]
+
+    if op in _IDENT_OPS:
+        return IDENT_FRAME.size
+
+    if op == TCPCHAN_OP_CHANNEL_PAYLOAD:
+        if available < CHANNEL_PAYLOAD_HEADER.size:
+            return None
+
+        *_, length = CHANNEL_PAYLOAD_HEADER.unpack_from(data, offset)
+        return CHANNEL_PAYLOAD_HEADER.size + length
+
+    if op in _FLAGGED_OPS:
+        if available < FLAGGED_PAYLOAD_HEADER.size:
+            return None
+
+        *_, length = FLAGGED_PAYLOAD_HEADER.unpack_from(data, offset)
+        return FLAGGED_PAYLOAD_HEADER.size + length
+
+    raise ValueError(f"unknown opcode {op}.")
+
+
+def _decode_frames(data):
+    """ Decode complete frames from buffered data
+
+        Decoding stops at the first incomplete frame or unknown opcode.
+
+        Arguments:
+            data (bytes, bytearray, memoryview): buffered data
+
+        Returns:
+            tuple(list, int): list of ```(op, ident, flags, payload)``` tuples
+                              and the number of processed bytes
+    """
+    frames = []
+    offset = 0
+    length = len(data)
+
+    with memoryview(data) as view:
+        while length - offset >= FRAME_PREFIX.size:
+            op = view[offset + 1]
+
+            if op in _IDENT_OPS:
+                if length - offset < IDENT_FRAME.size:
+                    break
+
+                _, _, ident = IDENT_FRAME.unpack_from(view, offset)
+                frames.append((op, ident, 0, None))
+                offset += IDENT_FRAME.size
+
+            elif op == TCPCHAN_OP_CHANNEL_PAYLOAD:
+                if length - offset < CHANNEL_PAYLOAD_HEADER.size:
+                    break
+
+                _, _, ident, size = CHANNEL_PAYLOAD_HEADER.unpack_from(view, offset)
+                start = offset + CHANNEL_PAYLOAD_HEADER.size
+                if start + size > length:
+                    break
+
+                frames.append((op, ident, 0, view[start : start + size].tobytes()))
+                offset = start + size
+
+            elif op in _FLAGGED_OPS:
+                if length - offset < FLAGGED_PAYLOAD_HEADER.size:
+                    break
+
+                _, _, ident, flags, size = FLAGGED_PAYLOAD_HEADER.unpack_from(
+                    view, offset
+                )
+                start = offset + FLAGGED_PAYLOAD_HEADER.size
+                if start + size > length:
+                    break
+
+                frames.append((op, ident, flags, view[start : start + size].tobytes()))
+                offset = start + size
+
+            else:
+                break
+
+    return frames, offset
+
+
+def _encode_channel_payload(channel_id, payload):
+    """ Encode a channel payload frame
+
+        Arguments:
+            channel_id (int): id of the channel
+            payload (bytes): payload of the frame
+
+        Returns:
+            raw (bytes): encoded frame
+    """
+    header = CHANNEL_PAYLOAD_HEADER.pack(
+        TCPCHAN_VERSION, TCPCHAN_OP_CHANNEL_PAYLOAD, channel_id, len(payload)
+    )
+    return header + payload
+
+
+def encode_channel_payloads(items):
+    """ Encode multiple channel payload frames into a single buffer
+
+        The buffer is allocated once and every frame header is packed in place.
+
+        Arguments:
+            items (iterable): ```(channel_id, payload)``` tuples
+
+        Returns:
+            raw (bytearray): encoded frames
+    """
+    items = list(items)
+
+    size = 0
+    for _, payload in items:
+        size += CHANNEL_PAYLOAD_HEADER.size + len(payload)
+
+    buf = bytearray(size)
+    offset = 0
+    for channel_id, payload in items:
+        length = len(payload)
+        CHANNEL_PAYLOAD_HEADER.pack_into(
+            buf,
+            offset,
+            TCPCHAN_VERSION,
+            TCPCHAN_OP_CHANNEL_PAYLOAD,
+            channel_id,
+            length,
+        )
+        offset += CHANNEL_PAYLOAD_HEADER.size
+        buf[offset : offset + length] = payload
+        offset += length
+
+    return buf
+
+
+def pack_channel_payload_header(channel_id, length):
+    """ Pack the header of a channel payload message
+
+        The header followed by ```length``` bytes of payload forms a complete
+        channel payload message, which allows the payload to be transmitted
+        without copying it into the message.
+
+        Arguments:
+            channel_id (int): id of the channel
+            length (int): length of the payload
+
+        Returns:
+            raw (bytes): packed header
+    """
+    return CHANNEL_PAYLOAD_HEADER.pack(
+        TCPCHAN_VERSION, TCPCHAN_OP_CHANNEL_PAYLOAD, channel_id, length
+    )
+
+
+def pack_channel_payload_headers(channel_ids, length):
+    """ Pack the headers of channel payload messages sharing the same payload
+
+        All headers are packed into a single buffer.
+
+        Arguments:
+            channel_ids (list): ids of the channels
+            length (int): length of the payload
+
+        Returns:
+            headers (list): list of memoryview, one header per channel
+    """
+    size = CHANNEL_PAYLOAD_HEADER.size
+    buf = bytearray(size * len(channel_ids))
+
+    for i, channel_id in enumerate(channel_ids):
+        CHANNEL_PAYLOAD_HEADER.pack_into(
+            buf,
+            i * size,
+            TCPCHAN_VERSION,
+            TCPCHAN_OP_CHANNEL_PAYLOAD,
+            channel_id,
+            length,
+        )
+
+    view = memoryview(buf)
+    return [view[i : i + size] for i in range(0, len(buf), size)]
+
+
+def encode_frame(op, ident, flags=0, payload=None):
+    """ Encode a frame
+
+        Arguments:
+            op (int): opcode of the frame
+            ident (int): id of the channel, or magic number for handshake frames
+            flags (int): optional, flags of the frame
+            payload (bytes): optional, payload of the frame
+
+        Returns:
+            raw (bytes): encoded frame
+
+        Raises:
+            ValueError: unknown opcode
+    """
+    if op in _IDENT_OPS:
+        return IDENT_FRAME.pack(TCPCHAN_VERSION, op, ident)
+
+    if payload is None:
+        payload = b""
+
+    if op == TCPCHAN_OP_CHANNEL_PAYLOAD:
+        return encode_channel_payload(ident, payload)
+
+    if op in _FLAGGED_OPS:
+        header = FLAGGED_PAYLOAD_HEADER.pack(
+            TCPCHAN_VERSION, op, ident, flags, len(payload)
+        )
+        return header + payload
+
+    raise ValueError(f"unknown opcode {op}.")
+
+
+try:
+    from tcpchan.core._speedups import decode_frames
+    from tcpchan.core._speedups import encode_channel_payload
+except ImportError:
+    decode_frames = _decode_frames
+    encode_channel_payload = _encode_channel_payload
+
+
+__all__ = [
+    "decode_frames",
+    "encode_channel_payload",
+    "encode_channel_payloads",
+    "encode_frame",
+    "frame_length",
+    "pack_channel_payload_header",
+    "pack_channel_payload_headers",
+]
@@ -1,19 +1,37 @@
+import collections
 import logging
+import os
 
-from io import BytesIO
 from random import randint
 
+from tcpchan.core.codec import CHANNEL_PAYLOAD_HEADER
+from tcpchan.core.codec import FLAGGED_PAYLOAD_HEADER
+from tcpchan.core.codec import TCPCHAN_FLAG_FIN
+from tcpchan.core.codec import TCPCHAN_FLAG_MORE
+from tcpchan.core.codec import TCPCHAN_MAX_FRAME_LENGTH
+from tcpchan.core.codec import TCPCHAN_MAX_PAYLOAD_SIZE
+from tcpchan.core.codec import TCPCHAN_OP_CHANNEL_DATAGRAM
+from tcpchan.core.codec import TCPCHAN_OP_CHANNEL_PAYLOAD
+from tcpchan.core.codec import TCPCHAN_OP_CLOSE_CHANNEL_REQUEST
+from tcpchan.core.codec import TCPCHAN_OP_CREATE_CHANNEL_REQUEST
+from tcpchan.core.codec import TCPCHAN_OP_CREATE_CHANNEL_WITH_PAYLOAD
+from tcpchan.core.codec import TCPCHAN_OP_HANDSHAKE_REPLY
+from tcpchan.core.codec import TCPCHAN_OP_HANDSHAKE_REQUEST
+from tcpchan.core.codec import decode_frames
+from tcpchan.core.codec import encode_channel_payload
+from tcpchan.core.codec import encode_channel_payloads
+from tcpchan.core.codec import encode_frame
+from tcpchan.core.codec import frame_length
+from tcpchan.core.codec import pack_channel_payload_header
+from tcpchan.core.codec import pack_channel_payload_headers
 from tcpchan.core.evt import ChannelClosed
 from tcpchan.core.evt import ChannelCreated
 from tcpchan.core.evt import DataTransmit
+from tcpchan.core.evt import FileTransmit
 from tcpchan.core.evt import HandshakeFailed
 from tcpchan.core.evt import HandshakeSuccess
-from tcpchan.core.msg import ChannelPayload
-from tcpchan.core.msg import CloseChannelRequest
-from tcpchan.core.msg import CreateChannelRequest
-from tcpchan.core.msg import HandshakeReply
-from tcpchan.core.msg import HandshakeRequest
-from tcpchan.core.msg import TCPChanMessage
+from tcpchan.core.evt import ProtocolError
+from tcpchan.core.evt import VectorTransmit
 
 
 CONN_STATE_IDLE = 0
@@ -22,9 +40,13 @@ CONN_STATE_ESTABLISHED = 2
 CONN_STATE_HANDSHAKE = 3
 CONN_STATE_HANDSHAKE_SUCCESS = 4
 CONN_STATE_HANDSHAKE_FAIL = 5
+CONN_STATE_PROTOCOL_ERROR = 6
 
 HANDSHAKE_MAGIC = 0xFEEDBACC
 
+CONN_MAX_FRAME_LENGTH = TCPCHAN_MAX_FRAME_LENGTH
+CONN_CHANNEL_POOL_SIZE = 0
+
 
 class BaseConnection:
     """ Base class for connection
@@ -32,8 +54,9 @@ class BaseConnection:
 
     def __init__(self, logger=None, event_callback=None):
         self._channels = {}
-        self._buf = BytesIO()
-        self._events = []
+        self._buf = bytearray()
+        self._need = 0
+        self._events = collections.deque()
         self._state = CONN_STATE_IDLE
         self._event_callback = event_callback
 
@@ -58,7 +81,7 @@ class BaseConnection:
         """
         raise NotImplementedError
 
-    def create_channel(self, channel_id=None):
+    def create_channel(self, channel_id=None, data=None, fin=False):
         raise NotImplementedError
 
     def close_channel(self, channel_id=0):
@@ -72,11 +95,24 @@ class BaseConnection:
         """
         raise NotImplementedError
 
+    @property
+    def buffered(self):
+        """ Number of bytes buffered for incomplete frames
+        """
+        return len(self._buf)
+
+    @property
+    def needed(self):
+        """ Number of bytes still needed to complete the pending frame,
+            zero if unknown
+        """
+        return self._need
+
     def next_event(self):
         """ Get next event from event queue
         """
         try:
-            return self._events.pop(0)
+            return self._events.popleft()
         except IndexError:
             return None
 
@@ -102,17 +138,34 @@ class Connection(BaseConnection):
         Attributes:
             channel_factory (callable): Factory function for channel creation.
             handshake_magic (int): Magic number to use during handshake
+            max_frame_length (int): optional, frames longer than this are rejected,
+                                    which also bounds the bytes buffered for an
+                                    incomplete frame
+            channel_pool_size (int): optional, maximum number of closed channels
+                                     kept for reuse, pooling is disabled if zero
     """
 
-    def __init__(self, channel_factory, handshake_magic=None, *arg, **kwargs):
+    def __init__(
+        self,
+        channel_factory,
+        handshake_magic=None,
+        max_frame_length=None,
+        channel_pool_size=CONN_CHANNEL_POOL_SIZE,
+        *arg,
+        **kwargs,
+    ):
         super().__init__(*arg, **kwargs)
 
         self._handlers = {
-            CreateChannelRequest: self._handle_create_channel_request,
-            CloseChannelRequest: self._handle_close_channel_request,
-            ChannelPayload: self._handle_channel_payload,
-            HandshakeRequest: self._handle_handshake_request,
-            HandshakeReply: self._handle_handshake_reply,
+            TCPCHAN_OP_CREATE_CHANNEL_REQUEST: self._handle_create_channel_request,
+            TCPCHAN_OP_CREATE_CHANNEL_WITH_PAYLOAD: (
+                self._handle_create_channel_with_payload
+            ),
+            TCPCHAN_OP_CLOSE_CHANNEL_REQUEST: self._handle_close_channel_request,
+            TCPCHAN_OP_CHANNEL_PAYLOAD: self._handle_channel_payload,
+            TCPCHAN_OP_CHANNEL_DATAGRAM: self._handle_channel_datagram,
+            TCPCHAN_OP_HANDSHAKE_REQUEST: self._handle_handshake_request,
+            TCPCHAN_OP_HANDSHAKE_REPLY: self._handle_handshake_reply,
         }
 
         if handshake_magic is None:
@@ -124,6 +177,37 @@ class Connection(BaseConnection):
         if not callable(self._channel_factory):
             raise ValueError("channel_factory must be callable.")
 
+        if max_frame_length is None:
+            max_frame_length = CONN_MAX_FRAME_LENGTH
+
+        # Frames without payload are never longer than the flagged payload header,
+        # so that they are accepted whether they are checked or not
+        if max_frame_length < FLAGGED_PAYLOAD_HEADER.size:
+            raise ValueError(
+                f"max_frame_length must be at least {FLAGGED_PAYLOAD_HEADER.size}."
+            )
+
+        self._max_frame_length = max_frame_length
+
+        if channel_pool_size < 0:
+            raise ValueError("channel_pool_size must not be negative.")
+
+        self._channel_pool_size = channel_pool_size
+        self._channel_pool = []
+        self._fin_channels = set()
+
+    @property
+    def max_frame_length(self):
+        """ Maximum length of a received frame
+        """
+        return self._max_frame_length
+
+    @property
+    def channel_pool_size(self):
+        """ Maximum number of closed channels kept for reuse
+        """
+        return self._channel_pool_size
+
     def connection_established(self):
         """ Called on connection establishment
         """
@@ -132,59 +216,320 @@ class Connection(BaseConnection):
 
     def data_received(self, data):
         """ Called on data reception from network
+
+            Malformed data and frames longer than ```max_frame_length``` result in
+            a ```ProtocolError``` event, after which further data is ignored.
+            Oversized frames are rejected as soon as their header is received, so
+            that at most ```max_frame_length``` bytes are buffered.
         """
-        self._buf.write(data)
+        if self._state == CONN_STATE_PROTOCOL_ERROR:
+            return
 
-        offset = 0
-        while True:
-            try:
-                msg, processed = TCPChanMessage.from_bytes(
-                    self._buf.getbuffer()[offset:]
-                )
-            except ValueError:
-                break
+        if self._need > len(data):
+            # The pending frame is still incomplete, no need to decode
+            self._buf += data
+            self._need -= len(data)
+            return
 
-            try:
-                self._handlers[msg.__class__](msg)
-            except KeyError:
-                self._logger.error('Unhandled message type "%s".', type(msg).__name__)
-                self.close()
+        if self._buf:
+            self._buf += data
+            frames, processed = decode_frames(self._buf)
+            del self._buf[:processed]
+        else:
+            # Decode in place, only the incomplete tail is buffered
+            frames, processed = decode_frames(data)
+            self._buf += memoryview(data)[processed:]
+
+        check_length = self._max_frame_length < TCPCHAN_MAX_FRAME_LENGTH
+
+        for op, ident, flags, payload in frames:
+            if check_length and payload is not None:
+                if op == TCPCHAN_OP_CHANNEL_PAYLOAD:
+                    length = CHANNEL_PAYLOAD_HEADER.size + len(payload)
+                else:
+                    length = FLAGGED_PAYLOAD_HEADER.size + len(payload)
+
+                if length > self._max_frame_length:
+                    self._frame_too_long(length)
+                    return
+
+            self._handlers[op](ident, flags, payload)
+
+            if self._state == CONN_STATE_PROTOCOL_ERROR:
+                return
 
-            offset += processed
+        self._need = 0
+        if self._buf:
+            self._check_pending_frame()
 
-        if offset > 0:
-            newbuf = BytesIO()
-            newbuf.write(self._buf.getbuffer()[offset:])
-            self._buf = newbuf
+    def _check_pending_frame(self):
+        try:
+            length = frame_length(self._buf)
+        except ValueError as e:
+            # Decoding stops at unknown opcodes, which are reported here
+            self._protocol_error(str(e))
+            return
+
+        if length is None:
+            # Header is incomplete
+            return
+
+        if length > self._max_frame_length:
+            self._frame_too_long(length)
+        else:
+            self._need = length - len(self._buf)
+
+    def _frame_too_long(self, length):
+        self._protocol_error(
+            f"frame length {length} exceeds limit {self._max_frame_length}."
+        )
+
+    def _protocol_error(self, reason):
+        self._logger.error("Protocol error: %s", reason)
+        self._state = CONN_STATE_PROTOCOL_ERROR
+        self._buf = bytearray()
+        self._need = 0
+        self.add_events([ProtocolError(reason=reason)])
 
     def channel_transmit_data(self, channel_id, data):
-        payload = ChannelPayload(Channel=channel_id, Payload=data)
+        payload = encode_channel_payload(channel_id, data)
 
-        self.add_events([DataTransmit(payload=payload.pack())])
+        self.add_events([DataTransmit(payload=payload)])
         self._logger.debug("Scheduled data transmission from channel %d.", channel_id)
 
+    def transmit_many(self, items):
+        """ Transmit data of multiple channels at once
+
+            All frames are encoded into a single buffer and scheduled as
+            a single ```DataTransmit``` event.
+
+            Arguments:
+                items (iterable): ```(channel_id, data)``` tuples, data of channels
+                                  which sent FIN is dropped
+        """
+        if self._fin_channels:
+            items = [item for item in items if self._writable(item[0])]
+
+        payload = encode_channel_payloads(items)
+
+        if payload:
+            self.add_events([DataTransmit(payload=payload)])
+            self._logger.debug(
+                "Scheduled batch transmission of %d bytes.", len(payload)
+            )
+
+    def _writable(self, channel_id):
+        if channel_id in self._fin_channels:
+            self._logger.warning("Dropping data of channel %d after FIN.", channel_id)
+            return False
+
+        return True
+
+    def channel_transmit_shared(self, channel_ids, data):
+        """ Transmit the same data over multiple channels
+
+            The data is shared by reference among the frames of all channels,
+            and only the frame headers are generated per channel. The frames
+            are scheduled as a single ```VectorTransmit``` event.
+
+            Arguments:
+                channel_ids (list): ids of the channels, channels which sent FIN
+                                    are skipped
+                data (bytes): data to transmit, must not be modified afterwards
+        """
+        data = memoryview(data)
+        if self._fin_channels:
+            channel_ids = [c for c in channel_ids if self._writable(c)]
+        else:
+            channel_ids = list(channel_ids)
+        if not channel_ids:
+            return
+
+        buffers = []
+        for offset in range(0, max(len(data), 1), TCPCHAN_MAX_PAYLOAD_SIZE):
+            chunk = data[offset : offset + TCPCHAN_MAX_PAYLOAD_SIZE]
+            headers = pack_channel_payload_headers(channel_ids, len(chunk))
+
+            for header in headers:
+                buffers += (header, chunk)
+
+        self.add_events([VectorTransmit(buffers=buffers)])
+        self._logger.debug(
+            "Scheduled shared transmission of %d bytes to %d channels.",
+            len(data),
+            len(channel_ids),
+        )
+
+    def channel_transmit_message(self, channel_id, data, fin=False):
+        """ Transmit a channel message
+
+            The message is delivered as a whole at the other end of the channel,
+            messages larger than a single frame are fragmented.
+
+            Arguments:
+                channel_id (int): id of the channel
+                data (bytes): the message
+                fin (bool): optional, indicate no more data will be sent on the
+                            channel after the message
+        """
+        data = memoryview(data)
+        fragments = []
+
+        for offset in range(0, max(len(data), 1), TCPCHAN_MAX_PAYLOAD_SIZE):
+            end = offset + TCPCHAN_MAX_PAYLOAD_SIZE
+            if end < len(data):
+                flags = TCPCHAN_FLAG_MORE
+            else:
+                flags = TCPCHAN_FLAG_FIN if fin else 0
+            fragments.append(
+                encode_frame(
+                    TCPCHAN_OP_CHANNEL_DATAGRAM, channel_id, flags, data[offset:end]
+                )
+            )
+
+        self.add_events([DataTransmit(payload=b"".join(fragments))])
+        self._logger.debug(
+            "Scheduled message transmission from channel %d in %d fragments.",
+            channel_id,
+            len(fragments),
+        )
+
+    def channel_transmit_file(self, channel_id, fileobj, offset=0, count=None):
+        """ Transmit file content over a channel
+
+            The content is not read by the connection, instead a ```FileTransmit```
+            event describing the frames is scheduled. Files with a file descriptor
+            are duplicated for the event, other file objects must be kept open
+            until the content is transmitted.
+            The duplicated descriptor shares the file position with ```fileobj```,
+            which is undefined after the call.
+
+            Arguments:
+                channel_id (int): id of the channel
+                fileobj (file): file opened in binary mode
+                offset (int): optional, offset of the content in the file
+                count (int): optional, number of bytes to transmit, defaults to
+                             the rest of the file
+
+            Raises:
+                ValueError: the range is out of the file
+        """
+        try:
+            size = os.fstat(fileobj.fileno()).st_size
+        except (AttributeError, OSError, ValueError):
+            size = fileobj.seek(0, os.SEEK_END)
+
+        if offset < 0 or offset > size:
+            raise ValueError(f"offset {offset} is out of file of size {size}.")
+
+        if count is None:
+            count = size - offset
+        elif count < 0 or offset + count > size:
+            raise ValueError(
+                f"count {count} at offset {offset} exceeds file of size {size}."
+            )
+
+        segments = []
+        for segment_offset in range(offset, offset + count, TCPCHAN_MAX_PAYLOAD_SIZE):
+            length = min(TCPCHAN_MAX_PAYLOAD_SIZE, offset + count - segment_offset)
+            header = pack_channel_payload_header(channel_id, length)
+            segments.append((header, segment_offset, length))
+
+        if segments:
+            # Transmission happens later, keep the file open on a duplicated
+            # descriptor so that the caller may close it right away
+            try:
+                fileobj = open(os.dup(fileobj.fileno()), "rb")
+                closefd = True
+            except (AttributeError, OSError, ValueError):
+                closefd = False
+
+            self.add_events(
+                [FileTransmit(file=fileobj, segments=segments, closefd=closefd)]
+            )
+            self._logger.debug(
+                "Scheduled file transmission of %d bytes from channel %d.",
+                count,
+                channel_id,
+            )
+
     def get_channel(self, channel_id):
         return self._channels.get(channel_id, None)
 
-    def create_channel(self, channel_id=None):
+    def create_channel(self, channel_id=None, data=None, fin=False):
+        """ Create new channel
+
+            If ```data``` is given, the first payload of the channel is piggybacked
+            on the channel creation request so that both are sent in a single frame.
+            If the new channel is in message mode, the first payload is sent as a
+            message following the channel creation request instead.
+
+            Arguments:
+                channel_id (int): optional, id of the channel
+                data (bytes): optional, first payload of the channel
+                fin (bool): optional, indicate no more data will be sent on the channel
+
+            Returns:
+                new_channel (Channel): Newly created channel
+
+            Raises:
+                ValueError: the first payload exceeds the maximum message size in
+                            message mode, or the maximum payload size otherwise
+        """
         if not channel_id:
             channel_id = randint(0, 2 ** 32)
 
         while channel_id in self._channels:
             channel_id += 1
 
-        msg = CreateChannelRequest(Channel=channel_id)
-        self.add_events([DataTransmit(payload=msg.pack())])
+        new_channel = self._new_channel()
+
+        if data is not None and new_channel.message_mode:
+            limit = new_channel.max_message_size
+        else:
+            limit = TCPCHAN_MAX_PAYLOAD_SIZE
+
+        if data is not None and len(data) > limit:
+            if len(self._channel_pool) < self._channel_pool_size:
+                self._channel_pool.append(new_channel)
+            raise ValueError(f"first payload size {len(data)} exceeds limit {limit}.")
+
+        if data is not None and new_channel.message_mode:
+            payload = encode_frame(TCPCHAN_OP_CREATE_CHANNEL_REQUEST, channel_id)
+            self.add_events([DataTransmit(payload=payload)])
+            self.channel_transmit_message(channel_id, data, fin)
+        elif data is None and not fin:
+            payload = encode_frame(TCPCHAN_OP_CREATE_CHANNEL_REQUEST, channel_id)
+            self.add_events([DataTransmit(payload=payload)])
+        else:
+            payload = encode_frame(
+                TCPCHAN_OP_CREATE_CHANNEL_WITH_PAYLOAD,
+                channel_id,
+                TCPCHAN_FLAG_FIN if fin else 0,
+                data,
+            )
+            self.add_events([DataTransmit(payload=payload)])
+
+        return self._create_channel(channel_id, fin_sent=fin, channel=new_channel)
+
+    def _new_channel(self):
+        if self._channel_pool:
+            channel = self._channel_pool.pop()
+            channel.reset()
+            return channel
 
-        return self._create_channel(channel_id)
+        return self._channel_factory()
 
-    def _create_channel(self, channel_id):
+    def _create_channel(self, channel_id, fin_sent=False, channel=None):
         if channel_id in self._channels:
             raise Exception(f"Duplicated channel id {channel_id}.")
 
-        new_channel = self._channel_factory()
+        new_channel = channel if channel is not None else self._new_channel()
         new_channel.set_channel_id(channel_id)
         new_channel.set_connection(self)
+        if fin_sent:
+            new_channel.set_fin_sent()
+            self._fin_channels.add(channel_id)
         new_channel.channel_created()
         self._channels[channel_id] = new_channel
 
@@ -194,58 +539,92 @@ class Connection(BaseConnection):
 
     def close_channel(self, channel_id):
         if self._delete_channel(channel_id):
-            msg = CloseChannelRequest(Channel=channel_id)
+            payload = encode_frame(TCPCHAN_OP_CLOSE_CHANNEL_REQUEST, channel_id)
             self.add_events(
-                [
-                    DataTransmit(payload=msg.pack()),
-                    ChannelClosed(channel_id=channel_id),
-                ]
+                [DataTransmit(payload=payload), ChannelClosed(channel_id=channel_id)]
             )
 
     def _delete_channel(self, channel_id):
         try:
             channel = self._channels[channel_id]
             del self._channels[channel_id]
+            self._fin_channels.discard(channel_id)
 
             channel.close()
+
+            # Pooled channels are reset on reuse, after closing has completed
+            if len(self._channel_pool) < self._channel_pool_size and channel.reusable:
+                self._channel_pool.append(channel)
+
             return True
         except KeyError:
             self._logger.error("Deleting a non-existed channel %d.", channel_id)
             return False
 
-    def _handle_create_channel_request(self, msg):
+    def _handle_create_channel_request(self, channel_id, flags, payload):
         self._logger.debug("handling create channel request.")
-        self._create_channel(msg.Channel)
+        if channel_id in self._channels:
+            self._protocol_error(f"duplicated channel id {channel_id}.")
+            return
+
+        self._create_channel(channel_id)
 
-    def _handle_close_channel_request(self, msg):
+    def _handle_create_channel_with_payload(self, channel_id, flags, payload):
+        self._logger.debug("handling create channel with payload request.")
+        if channel_id in self._channels:
+            self._protocol_error(f"duplicated channel id {channel_id}.")
+            return
+
+        channel = self._create_channel(channel_id)
+
+        if payload:
+            channel.data_received(payload)
+
+        if flags & TCPCHAN_FLAG_FIN:
+            channel.eof_received()
+
+    def _handle_close_channel_request(self, channel_id, flags, payload):
         self._logger.debug("handling close channel request.")
-        self._delete_channel(msg.Channel)
+        self._delete_channel(channel_id)
 
-    def _handle_channel_payload(self, msg):
+    def _handle_channel_payload(self, channel_id, flags, payload):
         self._logger.debug("handling channel payload.")
         try:
-            self._channels[msg.Channel].data_received(msg.Payload)
+            self._channels[channel_id].data_received(payload)
         except KeyError:
-            self._logger.error("Non-existed channel %d.", msg.Channel)
+            self._logger.error("Non-existed channel %d.", channel_id)
+
+    def _handle_channel_datagram(self, channel_id, flags, payload):
+        self._logger.debug("handling channel datagram.")
+        try:
+            channel = self._channels[channel_id]
+        except KeyError:
+            self._logger.error("Non-existed channel %d.", channel_id)
+            return
+
+        channel.fragment_received(payload, not flags & TCPCHAN_FLAG_MORE)
+
+        if flags & TCPCHAN_FLAG_FIN and not channel.is_closed:
+            channel.eof_received()
 
-    def _handle_handshake_request(self, msg):
+    def _handle_handshake_request(self, magic, flags, payload):
         self._logger.debug("handling handshake request.")
 
-        if msg.Magic != self._magic:
+        if magic != self._magic:
             self._logger.debug("handshake failed due to mismatched magic.")
             self._state = CONN_STATE_HANDSHAKE_FAIL
             self.add_events([HandshakeFailed(reason="Mismatched magic.")])
             return
 
         self._logger.debug("handshake succeeded, sending reply.")
-        msg = HandshakeReply(Magic=self._magic)
-        self.add_events([DataTransmit(payload=msg.pack()), HandshakeSuccess()])
+        payload = encode_frame(TCPCHAN_OP_HANDSHAKE_REPLY, self._magic)
+        self.add_events([DataTransmit(payload=payload), HandshakeSuccess()])
         self._state = CONN_STATE_HANDSHAKE_SUCCESS
 
-    def _handle_handshake_reply(self, msg):
+    def _handle_handshake_reply(self, magic, flags, payload):
         self._logger.debug("handling handshake reply.")
 
-        if msg.Magic == self._magic:
+        if magic == self._magic:
             self._logger.debug("hanshake succeeded.")
             self._state = CONN_STATE_HANDSHAKE_SUCCESS
             evt = HandshakeSuccess()
@@ -260,8 +639,8 @@ class Connection(BaseConnection):
 class ClientConnection(Connection):
     def connection_established(self):
         super().connection_established()
-        msg = HandshakeRequest(Magic=self._magic)
-        self.add_events([DataTransmit(payload=msg.pack())])
+        payload = encode_frame(TCPCHAN_OP_HANDSHAKE_REQUEST, self._magic)
+        self.add_events([DataTransmit(payload=payload)])
         self._state = CONN_STATE_HANDSHAKE
 
 
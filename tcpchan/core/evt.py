@@ -29,6 +29,18 @@ class HandshakeFailed(BaseEvent):
     reason: str
 
 
+@dataclass
+class ProtocolError(BaseEvent):
+    """ Protocol Error Event
+
+        When protocol error event is received, malformed data has been received
+        from the other end and the connection should be shutdown immediately,
+        the error is indicated in ```reason``` field.
+    """
+
+    reason: str
+
+
 @dataclass
 class DataTransmit(BaseEvent):
     """ Data Transmit Event
@@ -40,6 +52,36 @@ class DataTransmit(BaseEvent):
     payload: bytes
 
 
+@dataclass
+class VectorTransmit(BaseEvent):
+    """ Vector Transmit Event
+
+        Vector transmit event indicate the need for TX operation of multiple
+        buffers, which are to be transmitted in order, e.g. with ```writelines```.
+        The buffers in the ```buffers``` field may be shared between events and
+        must not be modified.
+    """
+
+    buffers: list
+
+
+@dataclass
+class FileTransmit(BaseEvent):
+    """ File Transmit Event
+
+        File transmit event indicate the need for transmitting file content. For
+        each ```(header, offset, count)``` tuple in the ```segments``` field, the
+        header is to be transmitted followed by ```count``` bytes of the file
+        starting at ```offset```, which allows the I/O library to transmit the
+        file content with ```sendfile```. If ```closefd``` is set, the file is
+        owned by the event and is to be closed once transmitted.
+    """
+
+    file: typing.Any
+    segments: list
+    closefd: bool = False
+
+
 @dataclass
 class ChannelClosed(BaseEvent):
     """ Channel Closed Event
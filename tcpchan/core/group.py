@@ -0,0 +1,91 @@
+class ChannelGroup:
+    """ TCPChan Channel Group
+
+        A group of channels, possibly on different connections, sharing the same
+        outbound data. Data written to the group is shared by reference among the
+        frames of all member channels, only the frame headers are generated per
+        channel. Closed channels are removed from the group automatically.
+
+        Data is sent as stream payload regardless of the message mode of the
+        member channels.
+
+        Attributes:
+            channels (iterable): optional, initial members of the group
+    """
+
+    def __init__(self, channels=()):
+        self._members = {}
+        self._size = 0
+
+        for channel in channels:
+            self.add(channel)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, channel):
+        return channel in self._members.get(channel.connection, ())
+
+    def __iter__(self):
+        for channels in list(self._members.values()):
+            yield from list(channels)
+
+    def add(self, channel):
+        """ Add a channel to the group
+
+            Arguments:
+                channel (Channel): the channel to add
+
+            Raises:
+                ValueError: the channel is closed, or sent FIN
+        """
+        if channel.is_closed:
+            raise ValueError(f"Adding closed channel {channel.channel_id} to group.")
+
+        if channel.fin_sent:
+            raise ValueError(
+                f"Adding channel {channel.channel_id} which sent FIN to group."
+            )
+
+        channels = self._members.setdefault(channel.connection, {})
+        if channel not in channels:
+            channels[channel] = None
+            self._size += 1
+            channel.add_close_callback(self._channel_closed)
+
+    def discard(self, channel):
+        """ Remove a channel from the group if it is a member
+
+            Arguments:
+                channel (Channel): the channel to remove
+        """
+        channels = self._members.get(channel.connection)
+        if channels is None or channel not in channels:
+            return
+
+        del channels[channel]
+        self._size -= 1
+        channel.remove_close_callback(self._channel_closed)
+
+        if not channels:
+            del self._members[channel.connection]
+
+    def _channel_closed(self, channel):
+        self.discard(channel)
+
+    def write_data(self, data):
+        """ Send data to all channels of the group
+
+            Arguments:
+                data (bytes): data to send, must not be modified afterwards
+        """
+        if not isinstance(data, bytes):
+            data = bytes(data)
+
+        for connection, channels in list(self._members.items()):
+            connection.channel_transmit_shared(
+                [channel.channel_id for channel in channels], data
+            )
+
+
+__all__ = ["ChannelGroup"]
@@ -3,13 +3,18 @@ from fpack import Message
 from fpack import Uint8
 from fpack import Uint32
 from fpack import field_factory
-
-
-TCPCHAN_OP_HANDSHAKE_REQUEST = 1
-TCPCHAN_OP_HANDSHAKE_REPLY = 2
-TCPCHAN_OP_CREATE_CHANNEL_REQUEST = 3
-TCPCHAN_OP_CLOSE_CHANNEL_REQUEST = 4
-TCPCHAN_OP_CHANNEL_PAYLOAD = 5
+from tcpchan.core.codec import TCPCHAN_FLAG_FIN  # noqa: F401
+from tcpchan.core.codec import TCPCHAN_FLAG_MORE  # noqa: F401
+from tcpchan.core.codec import TCPCHAN_MAX_PAYLOAD_SIZE  # noqa: F401
+from tcpchan.core.codec import TCPCHAN_OP_CHANNEL_DATAGRAM
+from tcpchan.core.codec import TCPCHAN_OP_CHANNEL_PAYLOAD
+from tcpchan.core.codec import TCPCHAN_OP_CLOSE_CHANNEL_REQUEST
+from tcpchan.core.codec import TCPCHAN_OP_CREATE_CHANNEL_REQUEST
+from tcpchan.core.codec import TCPCHAN_OP_CREATE_CHANNEL_WITH_PAYLOAD
+from tcpchan.core.codec import TCPCHAN_OP_HANDSHAKE_REPLY
+from tcpchan.core.codec import TCPCHAN_OP_HANDSHAKE_REQUEST
+from tcpchan.core.codec import TCPCHAN_VERSION
+from tcpchan.core.codec import pack_channel_payload_header  # noqa: F401
 
 
 class BaseTCPChanMessage(Message):
@@ -24,7 +29,7 @@ class BaseTCPChanMessage(Message):
         field_factory("Version", Uint8),
         field_factory("Op", Uint8),
     ]
-    version = 0
+    version = TCPCHAN_VERSION
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -55,6 +60,14 @@ class TCPChanMessage(BaseTCPChanMessage):
         if msg.Op == TCPCHAN_OP_CHANNEL_PAYLOAD:
             return ChannelPayload.from_bytes(data)
 
+        if msg.Op == TCPCHAN_OP_CREATE_CHANNEL_WITH_PAYLOAD:
+            return CreateChannelWithPayload.from_bytes(data)
+
+        if msg.Op == TCPCHAN_OP_CHANNEL_DATAGRAM:
+            return ChannelDatagram.from_bytes(data)
+
+        raise ValueError(f"unknown opcode {msg.Op}.")
+
 
 class HandshakeRequest(BaseTCPChanMessage):
     """ Handshake Request Message
@@ -118,6 +131,35 @@ class ChannelPayload(BaseTCPChanMessage):
     ]
 
 
+class CreateChannelWithPayload(BaseTCPChanMessage):
+    """ Create Channel With Payload Message
+
+        Create channel with payload message requests channel creation and delivers the first
+        payload of the channel in a single frame. If ```TCPCHAN_FLAG_FIN``` is set in ```Flags```,
+        the sender will not send further payload on the channel.
+    """
+
+    opcode = TCPCHAN_OP_CREATE_CHANNEL_WITH_PAYLOAD
+    Fields = ChannelMessage.Fields + [
+        field_factory("Flags", Uint8),
+        field_factory("Payload", Bytes),
+    ]
+
+
+class ChannelDatagram(BaseTCPChanMessage):
+    """ Channel Datagram Message
+
+        Channel datagram message delivers a fragment of a channel message. ```TCPCHAN_FLAG_MORE```
+        is set in ```Flags``` of every fragment but the last one of the message.
+    """
+
+    opcode = TCPCHAN_OP_CHANNEL_DATAGRAM
+    Fields = ChannelMessage.Fields + [
+        field_factory("Flags", Uint8),
+        field_factory("Payload", Bytes),
+    ]
+
+
 __all__ = [
     "TCPChanMessage",
     "HandshakeRequest",
@@ -125,4 +167,6 @@ __all__ = [
     "CreateChannelRequest",
     "CloseChannelRequest",
     "ChannelPayload",
+    "CreateChannelWithPayload",
+    "ChannelDatagram",
 ]
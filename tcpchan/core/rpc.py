@@ -0,0 +1,86 @@
+import struct
+
+
+RPC_KIND_REQUEST = 0
+RPC_KIND_RESPONSE = 1
+RPC_KIND_ERROR = 2
+
+RPC_HEADER = struct.Struct("!BII")
+
+RPC_MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+def encode_rpc_message(kind, correlation_id, payload):
+    """ Encode a length-delimited RPC message
+
+        Arguments:
+            kind (int): kind of the message, one of ```RPC_KIND_*```
+            correlation_id (int): id matching the response to its request
+            payload (bytes): payload of the message
+
+        Returns:
+            raw (bytes): encoded message
+    """
+    return RPC_HEADER.pack(kind, correlation_id, len(payload)) + bytes(payload)
+
+
+class RPCDecoder:
+    """ RPC Message Decoder
+
+        Incremental decoder for length-delimited RPC messages carried on a channel.
+        Channel data can be fed in arbitrary chunks, complete messages are returned
+        as soon as they are available.
+
+        Attributes:
+            max_message_size (int): optional, maximum size of a message payload
+    """
+
+    def __init__(self, max_message_size=RPC_MAX_MESSAGE_SIZE):
+        self._buf = bytearray()
+        self._max_message_size = max_message_size
+
+    def feed(self, data):
+        """ Feed channel data to the decoder
+
+            Arguments:
+                data (bytes): received channel data
+
+            Returns:
+                messages (list): list of ```(kind, correlation_id, payload)``` tuples
+
+            Raises:
+                ValueError: message exceeds the maximum message size
+        """
+        self._buf += data
+
+        messages = []
+        offset = 0
+        while len(self._buf) - offset >= RPC_HEADER.size:
+            kind, correlation_id, length = RPC_HEADER.unpack_from(self._buf, offset)
+
+            if length > self._max_message_size:
+                raise ValueError(
+                    f"message size {length} exceeds limit {self._max_message_size}."
+                )
+
+            end = offset + RPC_HEADER.size + length
+            if end > len(self._buf):
+                break
+
+            messages.append(
+                (kind, correlation_id, bytes(self._buf[offset + RPC_HEADER.size : end]))
+            )
+            offset = end
+
+        if offset > 0:
+            del self._buf[:offset]
+
+        return messages
+
+    def reset(self):
+        """ Discard buffered data
+        """
+        self._buf = bytearray()
+
+
+__all__ = ["RPCDecoder", "encode_rpc_message"]
@@ -0,0 +1,4 @@
+""" TCPChan tools
+
+    Development tools for recording, replaying and fuzzing TCPChan traffic.
+"""
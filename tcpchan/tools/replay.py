@@ -0,0 +1,284 @@
+""" Replay and fuzz TCPChan wire traces
+
+    Replays recorded inbound byte streams into ```Connection.data_received```,
+    optionally re-chunked, and reports the parse throughput. In fuzzing mode,
+    mutated traces are replayed to check that malformed input never raises,
+    never grows the receive buffer beyond a single frame, and that parsing
+    time scales linearly with the input size.
+
+    Usage:
+        python -m tcpchan.tools.replay [TRACE] [--chunking MODE] [--repeat N]
+        python -m tcpchan.tools.replay [TRACE] --fuzz ITERATIONS [--seed SEED]
+"""
+
+import argparse
+import logging
+import random
+import struct
+import sys
+import time
+
+from tcpchan.core.chan import Channel
+from tcpchan.core.codec import TCPCHAN_MAX_FRAME_LENGTH
+from tcpchan.core.codec import TCPCHAN_OP_CHANNEL_PAYLOAD
+from tcpchan.core.codec import TCPCHAN_OP_CLOSE_CHANNEL_REQUEST
+from tcpchan.core.codec import TCPCHAN_OP_CREATE_CHANNEL_REQUEST
+from tcpchan.core.codec import TCPCHAN_OP_CREATE_CHANNEL_WITH_PAYLOAD
+from tcpchan.core.codec import TCPCHAN_OP_HANDSHAKE_REQUEST
+from tcpchan.core.codec import decode_frames
+from tcpchan.core.codec import encode_frame
+from tcpchan.core.conn import HANDSHAKE_MAGIC
+from tcpchan.core.conn import Connection
+from tcpchan.tools.trace import CHUNKING_BYTE
+from tcpchan.tools.trace import CHUNKING_MODES
+from tcpchan.tools.trace import CHUNKING_ORIGINAL
+from tcpchan.tools.trace import CHUNKING_RANDOM
+from tcpchan.tools.trace import read_trace
+from tcpchan.tools.trace import rechunk
+
+
+# Maximum tolerated growth of the parse time per byte when the input grows
+SCALING_TOLERANCE = 4.0
+
+# Maximum size of the slice of the trace mutated in each fuzzing iteration
+FUZZ_WINDOW = 128 * 1024
+
+
+class SinkChannel(Channel):
+    def data_received(self, data):
+        pass
+
+
+def replay(chunks, connection=None):
+    """ Replay chunks into a connection
+
+        Arguments:
+            chunks (list): chunks of the inbound byte stream
+            connection (Connection): optional, the connection to feed
+
+        Returns:
+            tuple(float, int): elapsed time in seconds and the maximum number
+                               of buffered bytes
+    """
+    if connection is None:
+        connection = Connection(SinkChannel)
+        connection.connection_established()
+
+    max_buffered = 0
+    start = time.perf_counter()
+
+    for chunk in chunks:
+        connection.data_received(chunk)
+
+        while connection.next_event() is not None:
+            pass
+
+        max_buffered = max(max_buffered, connection.buffered)
+
+    return time.perf_counter() - start, max_buffered
+
+
+def count_frames(data):
+    """ Count the number of decodable frames in a byte stream
+    """
+    frames, _ = decode_frames(data)
+    return len(frames)
+
+
+def synthetic_trace(rng, frames=1000, max_payload_size=4096):
+    """ Generate a synthetic inbound byte stream
+
+        Arguments:
+            rng (random.Random): random number generator
+            frames (int): optional, number of channel frames
+            max_payload_size (int): optional, maximum size of payloads
+
+        Returns:
+            chunks (list): chunks of the byte stream
+    """
+    chunks = [encode_frame(TCPCHAN_OP_HANDSHAKE_REQUEST, HANDSHAKE_MAGIC)]
+    channels = []
+
+    for _ in range(frames):
+        action = rng.random()
+
+        if not channels or action < 0.05:
+            channel_id = rng.getrandbits(32)
+            channels.append(channel_id)
+            chunks.append(encode_frame(TCPCHAN_OP_CREATE_CHANNEL_REQUEST, channel_id))
+        elif action < 0.1:
+            channel_id = rng.getrandbits(32)
+            channels.append(channel_id)
+            payload = bytes(rng.randint(0, max_payload_size))
+            chunks.append(
+                encode_frame(
+                    TCPCHAN_OP_CREATE_CHANNEL_WITH_PAYLOAD, channel_id, 0, payload
+                )
+            )
+        elif action < 0.12:
+            channel_id = channels.pop(rng.randrange(len(channels)))
+            chunks.append(encode_frame(TCPCHAN_OP_CLOSE_CHANNEL_REQUEST, channel_id))
+        else:
+            channel_id = rng.choice(channels)
+            payload = bytes(rng.randint(0, max_payload_size))
+            chunks.append(
+                encode_frame(TCPCHAN_OP_CHANNEL_PAYLOAD, channel_id, 0, payload)
+            )
+
+    return chunks
+
+
+def mutate(data, rng):
+    """ Apply a random mutation to a byte stream
+
+        Arguments:
+            data (bytes): the byte stream
+            rng (random.Random): random number generator
+
+        Returns:
+            data (bytes): mutated byte stream
+    """
+    data = bytearray(data)
+    if not data:
+        return bytes(rng.getrandbits(8) for _ in range(rng.randint(1, 64)))
+
+    mutation = rng.randrange(6)
+    pos = rng.randrange(len(data))
+
+    if mutation == 0:
+        # Bit flip
+        data[pos] ^= 1 << rng.randrange(8)
+    elif mutation == 1:
+        # Random opcode
+        data[pos] = rng.getrandbits(8)
+    elif mutation == 2:
+        # Insert garbage
+        data[pos:pos] = bytes(rng.getrandbits(8) for _ in range(rng.randint(1, 32)))
+    elif mutation == 3:
+        # Delete a range
+        del data[pos : pos + rng.randint(1, 32)]
+    elif mutation == 4:
+        # Announce a huge payload
+        data[pos : pos + 2] = struct.pack("!H", 0xFFFF)
+    else:
+        # Truncate
+        del data[pos:]
+
+    return bytes(data)
+
+
+def check_scaling(chunking=CHUNKING_BYTE, frames=2):
+    """ Check that parse time scales linearly with the input size
+
+        Maximum-size frames are replayed with ```frames``` and ```4 * frames```
+        frames, the parse time per byte must not grow beyond ```SCALING_TOLERANCE```.
+
+        Returns:
+            ratio (float): growth of the parse time per byte
+    """
+    frame = encode_frame(TCPCHAN_OP_CHANNEL_PAYLOAD, 1, 0, bytes(0xFFFF))
+    prologue = encode_frame(TCPCHAN_OP_CREATE_CHANNEL_REQUEST, 1)
+
+    def per_byte(count):
+        chunks = rechunk([prologue] + [frame] * count, chunking)
+        elapsed, _ = replay(chunks)
+        return elapsed / (len(frame) * count)
+
+    # Take the best of a few runs to reduce noise
+    small = min(per_byte(frames) for _ in range(3))
+    large = min(per_byte(frames * 4) for _ in range(3))
+
+    return large / small
+
+
+def fuzz(chunks, iterations, rng, report=print):
+    """ Replay mutated traces
+
+        Arguments:
+            chunks (list): chunks of the original byte stream
+            iterations (int): number of mutated traces to replay
+            rng (random.Random): random number generator
+            report (callable): optional, called with failure descriptions
+
+        Returns:
+            failures (int): number of failed iterations
+    """
+    data = b"".join(chunks)
+    failures = 0
+
+    for i in range(iterations):
+        start = rng.randrange(max(len(data) - FUZZ_WINDOW, 0) + 1)
+        mutated = data[start : start + FUZZ_WINDOW]
+        for _ in range(rng.randint(1, 8)):
+            mutated = mutate(mutated, rng)
+
+        mode = rng.choice(CHUNKING_MODES)
+        mutated_chunks = rechunk([mutated], mode, rng=rng)
+
+        try:
+            _, max_buffered = replay(mutated_chunks)
+        except Exception as e:
+            report(f"iteration {i}: {mode} chunking raised {e!r}")
+            failures += 1
+            continue
+
+        if max_buffered >= TCPCHAN_MAX_FRAME_LENGTH:
+            report(f"iteration {i}: {max_buffered} bytes buffered")
+            failures += 1
+
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay and fuzz TCPChan wire traces.")
+    parser.add_argument(
+        "trace", nargs="?", help="trace file, a synthetic trace is used if omitted"
+    )
+    parser.add_argument("--chunking", choices=CHUNKING_MODES, default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--fuzz", type=int, default=0, metavar="ITERATIONS")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    # Malformed input is expected, silence the connection logs
+    logging.disable(logging.CRITICAL)
+
+    rng = random.Random(args.seed)
+
+    if args.trace:
+        with open(args.trace, "rb") as f:
+            chunks = [chunk for _, chunk in read_trace(f)]
+    else:
+        chunks = synthetic_trace(rng)
+
+    data = b"".join(chunks)
+    frames = count_frames(data)
+    print(f"trace: {len(chunks)} chunks, {len(data)} bytes, {frames} frames")
+
+    modes = [args.chunking] if args.chunking else CHUNKING_MODES
+    for mode in modes:
+        best = None
+        for _ in range(args.repeat):
+            elapsed, _ = replay(rechunk(chunks, mode, rng=rng))
+            best = elapsed if best is None else min(best, elapsed)
+
+        throughput = len(data) / best / 1e6
+        print(f"{mode:>10}: {throughput:8.1f} MB/s {frames / best:10.0f} frames/s")
+
+    if not args.fuzz:
+        return 0
+
+    failures = fuzz(chunks, args.fuzz, rng)
+
+    for mode in (CHUNKING_BYTE, CHUNKING_RANDOM, CHUNKING_ORIGINAL):
+        ratio = check_scaling(mode)
+        if ratio > SCALING_TOLERANCE:
+            print(f"{mode} chunking: parse time per byte grows {ratio:.1f}x")
+            failures += 1
+
+    print(f"fuzz: {args.fuzz} iterations, {failures} failures")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
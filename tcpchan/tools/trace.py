@@ -0,0 +1,167 @@
+""" Wire trace recording and replay
+
+    A trace is a compact record of the raw inbound byte stream of a connection.
+    It starts with ```TRACE_MAGIC```, followed by one record per received chunk.
+    Each record consists of the time elapsed since the previous record in
+    microseconds and the length of the chunk, both encoded as unsigned varints,
+    followed by the chunk itself.
+"""
+
+import random
+import time
+
+
+TRACE_MAGIC = b"TCTR\x01"
+
+CHUNKING_ORIGINAL = "original"
+CHUNKING_BYTE = "byte"
+CHUNKING_RANDOM = "random"
+CHUNKING_COALESCE = "coalesce"
+
+CHUNKING_MODES = (
+    CHUNKING_ORIGINAL,
+    CHUNKING_BYTE,
+    CHUNKING_RANDOM,
+    CHUNKING_COALESCE,
+)
+
+
+def _encode_varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+
+    out.append(value)
+    return bytes(out)
+
+
+def _read_varint(fileobj):
+    value = 0
+    shift = 0
+    while True:
+        byte = fileobj.read(1)
+        if not byte:
+            if shift == 0:
+                return None
+
+            raise ValueError("truncated trace record.")
+
+        value |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return value
+
+        shift += 7
+
+
+class TraceWriter:
+    """ Trace Writer
+
+        Records received chunks to a trace file.
+
+        Attributes:
+            fileobj (file): file opened in binary write mode
+    """
+
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self._last = time.monotonic()
+        self._file.write(TRACE_MAGIC)
+
+    def record(self, data):
+        """ Record a received chunk
+
+            Arguments:
+                data (bytes): the received chunk
+        """
+        now = time.monotonic()
+        delta = int((now - self._last) * 1000000)
+        self._last = now
+
+        self._file.write(_encode_varint(delta) + _encode_varint(len(data)))
+        self._file.write(data)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_trace(fileobj):
+    """ Read the records of a trace file
+
+        Arguments:
+            fileobj (file): file opened in binary read mode
+
+        Returns:
+            records (generator): ```(delay, chunk)``` tuples, where delay is the time
+                                 elapsed since the previous record in seconds
+
+        Raises:
+            ValueError: malformed trace file
+    """
+    if fileobj.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+        raise ValueError("not a trace file.")
+
+    while True:
+        delta = _read_varint(fileobj)
+        if delta is None:
+            return
+
+        length = _read_varint(fileobj)
+        if length is None:
+            raise ValueError("truncated trace record.")
+
+        chunk = fileobj.read(length)
+        if len(chunk) != length:
+            raise ValueError("truncated trace record.")
+
+        yield delta / 1000000, chunk
+
+
+def rechunk(chunks, mode, rng=None, max_chunk_size=4096):
+    """ Re-chunk a byte stream
+
+        Arguments:
+            chunks (iterable): chunks of the byte stream
+            mode (str): one of ```CHUNKING_MODES```, ```original``` keeps the chunks,
+                        ```byte``` splits into 1-byte chunks, ```random``` splits into
+                        chunks of random size and ```coalesce``` joins all chunks
+            rng (random.Random): optional, random number generator
+            max_chunk_size (int): optional, maximum size of random chunks
+
+        Returns:
+            chunks (list): re-chunked byte stream
+    """
+    chunks = list(chunks)
+
+    if mode == CHUNKING_ORIGINAL:
+        return chunks
+
+    data = b"".join(chunks)
+
+    if mode == CHUNKING_COALESCE:
+        return [data] if data else []
+
+    if mode == CHUNKING_BYTE:
+        return [data[i : i + 1] for i in range(len(data))]
+
+    if mode == CHUNKING_RANDOM:
+        rng = rng or random.Random()
+        result = []
+        offset = 0
+        while offset < len(data):
+            size = rng.randint(1, max_chunk_size)
+            result.append(data[offset : offset + size])
+            offset += size
+
+        return result
+
+    raise ValueError(f"unknown chunking mode {mode}.")
+
+
+__all__ = ["TraceWriter", "read_trace", "rechunk"]
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+import unittest
+
+
+try:
+    import tcpchan  # noqa: F401
+except ImportError:
+    import os
+    import sys
+
+    sys.path.append(os.path.abspath(os.path.join(os.getcwd(), "..")))
+
+from tcpchan.core.buf import SpillBuffer
+from tcpchan.core.chan import BufferedChannel
+from tcpchan.core.conn import Connection
+from tcpchan.core.msg import ChannelPayload
+from tcpchan.core.msg import CloseChannelRequest
+from tcpchan.core.msg import CreateChannelRequest
+
+
+class TestSpillBuffer(unittest.TestCase):
+    def test_in_memory(self):
+        buf = SpillBuffer(threshold=16)
+        buf.write(b"hello ")
+        buf.write(b"world")
+
+        self.assertFalse(buf.spilled)
+        self.assertEqual(len(buf), 11)
+        self.assertEqual(buf.read(6), b"hello ")
+        self.assertEqual(buf.read(), b"world")
+        self.assertEqual(len(buf), 0)
+
+    def test_spill(self):
+        buf = SpillBuffer(threshold=16)
+        chunks = [bytes([i]) * 1000 for i in range(50)]
+
+        for chunk in chunks:
+            buf.write(chunk)
+
+        self.assertTrue(buf.spilled)
+        self.assertEqual(len(buf), 50000)
+        self.assertEqual(buf.read(), b"".join(chunks))
+
+        # The temporary file is released once drained
+        self.assertFalse(buf.spilled)
+
+    def test_interleaved_read_write(self):
+        buf = SpillBuffer(threshold=16)
+        expected = bytearray()
+        received = bytearray()
+
+        for i in range(200):
+            chunk = bytes([i]) * (i * 37 % 5000)
+            buf.write(chunk)
+            expected += chunk
+            received += buf.read(3000)
+
+        received += buf.read()
+        self.assertEqual(received, expected)
+
+    def test_close(self):
+        buf = SpillBuffer(threshold=16)
+        buf.write(b"x" * 100)
+        buf.close()
+
+        self.assertFalse(buf.spilled)
+        self.assertEqual(len(buf), 0)
+
+
+class TestBufferedChannel(unittest.TestCase):
+    def test_buffered_channel(self):
+        conn = Connection(lambda: BufferedChannel(spill_threshold=1024))
+        conn.connection_established()
+
+        conn.data_received(CreateChannelRequest(Channel=1234).pack())
+        channel = conn.next_event().channel
+
+        for i in range(10):
+            msg = ChannelPayload(Channel=1234, Payload=bytes([i]) * 500)
+            conn.data_received(msg.pack())
+
+        self.assertEqual(channel.buffered, 5000)
+        self.assertEqual(channel.read(500), bytes([0]) * 500)
+        self.assertEqual(
+            channel.read(), b"".join(bytes([i]) * 500 for i in range(1, 10))
+        )
+
+    def test_pooled_buffered_channel(self):
+        conn = Connection(
+            lambda: BufferedChannel(spill_threshold=1024), channel_pool_size=1
+        )
+        conn.connection_established()
+
+        conn.data_received(CreateChannelRequest(Channel=1234).pack())
+        channel = conn.next_event().channel
+        conn.data_received(ChannelPayload(Channel=1234, Payload=b"x" * 5000).pack())
+        self.assertTrue(channel._inbound.spilled)
+
+        # Channels with unread data are not pooled
+        conn.data_received(CloseChannelRequest(Channel=1234).pack())
+        self.assertTrue(channel.is_closed)
+        self.assertIsNot(conn.create_channel(5678), channel)
+        self.assertEqual(channel.read(), b"x" * 5000)
+        self.assertFalse(channel._inbound.spilled)
+
+        # Drained channels are pooled and reused
+        conn.data_received(CreateChannelRequest(Channel=1).pack())
+        drained = conn.get_channel(1)
+        drained.close()
+        self.assertIs(conn.create_channel(2), drained)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+import random
+import struct
+import unittest
+
+
+try:
+    import tcpchan  # noqa: F401
+except ImportError:
+    import os
+    import sys
+
+    sys.path.append(os.path.abspath(os.path.join(os.getcwd(), "..")))
+
+from tcpchan.core import codec
+from tcpchan.core.codec import TCPCHAN_FLAG_FIN
+from tcpchan.core.codec import TCPCHAN_OP_CHANNEL_PAYLOAD
+from tcpchan.core.codec import TCPCHAN_OP_CREATE_CHANNEL_REQUEST
+from tcpchan.core.codec import TCPCHAN_OP_CREATE_CHANNEL_WITH_PAYLOAD
+from tcpchan.core.codec import TCPCHAN_OP_HANDSHAKE_REQUEST
+from tcpchan.core.codec import encode_frame
+from tcpchan.core.codec import frame_length
+from tcpchan.core.msg import ChannelDatagram
+from tcpchan.core.msg import ChannelPayload
+from tcpchan.core.msg import CloseChannelRequest
+from tcpchan.core.msg import CreateChannelRequest
+from tcpchan.core.msg import CreateChannelWithPayload
+from tcpchan.core.msg import HandshakeReply
+from tcpchan.core.msg import HandshakeRequest
+
+
+try:
+    from tcpchan.core import _speedups
+except ImportError:
+    _speedups = None
+
+
+def sample_messages():
+    return [
+        HandshakeRequest(Magic=0xFEEDBACC),
+        HandshakeReply(Magic=0xFEEDBACC),
+        CreateChannelRequest(Channel=1),
+        CreateChannelWithPayload(Channel=2, Flags=TCPCHAN_FLAG_FIN, Payload=b"req"),
+        ChannelPayload(Channel=0xFFFFFFFF, Payload=b"x" * 1000),
+        ChannelPayload(Channel=3, Payload=b""),
+        ChannelDatagram(Channel=4, Flags=0, Payload=b"message"),
+        CloseChannelRequest(Channel=1),
+    ]
+
+
+class TestCodec(unittest.TestCase):
+    def test_decode_messages(self):
+        messages = sample_messages()
+        data = b"".join(msg.pack() for msg in messages)
+
+        for decode in (codec._decode_frames, codec.decode_frames):
+            frames, processed = decode(data)
+            self.assertEqual(processed, len(data))
+            self.assertEqual([frame[0] for frame in frames], [m.Op for m in messages])
+
+            for (op, ident, flags, payload), msg in zip(frames, messages):
+                self.assertEqual(ident, msg.Channel or msg.Magic)
+                self.assertEqual(flags, msg.Flags or 0)
+                self.assertEqual(payload, msg.Payload)
+
+    def test_decode_incomplete(self):
+        data = ChannelPayload(Channel=1, Payload=b"payload").pack()
+
+        for i in range(len(data)):
+            self.assertEqual(codec.decode_frames(data[:i]), ([], 0))
+
+    def test_encode_matches_messages(self):
+        self.assertEqual(
+            encode_frame(TCPCHAN_OP_HANDSHAKE_REQUEST, 0xFEEDBACC),
+            HandshakeRequest(Magic=0xFEEDBACC).pack(),
+        )
+        self.assertEqual(
+            encode_frame(TCPCHAN_OP_CREATE_CHANNEL_REQUEST, 1),
+            CreateChannelRequest(Channel=1).pack(),
+        )
+        self.assertEqual(
+            encode_frame(TCPCHAN_OP_CREATE_CHANNEL_WITH_PAYLOAD, 2, 1, b"req"),
+            CreateChannelWithPayload(Channel=2, Flags=1, Payload=b"req").pack(),
+        )
+        self.assertEqual(
+            encode_frame(TCPCHAN_OP_CHANNEL_PAYLOAD, 3, payload=b"data"),
+            ChannelPayload(Channel=3, Payload=b"data").pack(),
+        )
+
+    def test_encode_oversized_payload(self):
+        with self.assertRaises(struct.error):
+            codec.encode_channel_payload(1, b"x" * 0x10000)
+
+    def test_frame_length(self):
+        for msg in sample_messages():
+            data = msg.pack()
+            self.assertEqual(frame_length(data), len(data))
+
+        self.assertEqual(frame_length(b"\x00"), None)
+
+        with self.assertRaises(ValueError):
+            frame_length(b"\x00\xff")
+
+
+@unittest.skipIf(_speedups is None, "C speedups are not built.")
+class TestSpeedupsDifferential(unittest.TestCase):
+    def assertSameResult(self, func, py_func, *args):
+        try:
+            expected = py_func(*args)
+        except Exception as e:
+            with self.assertRaises(type(e)):
+                func(*args)
+            return
+
+        self.assertEqual(func(*args), expected)
+
+    def test_decode_fuzz(self):
+        rng = random.Random(0)
+        valid = b"".join(msg.pack() for msg in sample_messages())
+
+        for _ in range(5000):
+            kind = rng.random()
+            if kind < 0.3:
+                # Random garbage
+                data = bytes(rng.getrandbits(8) for _ in range(rng.randint(0, 64)))
+            elif kind < 0.6:
+                # Truncated valid stream
+                data = valid[: rng.randint(0, len(valid))]
+            else:
+                # Valid stream with corrupted bytes
+                data = bytearray(valid)
+                for _ in range(rng.randint(1, 4)):
+                    data[rng.randrange(len(data))] = rng.getrandbits(8)
+
+            for buf in (bytes(data), bytearray(data), memoryview(bytes(data))):
+                self.assertSameResult(
+                    _speedups.decode_frames, codec._decode_frames, buf
+                )
+
+    def test_encode_fuzz(self):
+        rng = random.Random(0)
+        channel_ids = [0, 1, 0xFFFFFFFF, 0x100000000, -1, 1.5, rng.getrandbits(32)]
+        payloads = [b"", b"x", bytearray(b"abc"), memoryview(b"view"), b"y" * 0xFFFF]
+        payloads.append(b"z" * 0x10000)
+
+        for channel_id in channel_ids:
+            for payload in payloads:
+                self.assertSameResult(
+                    _speedups.encode_channel_payload,
+                    codec._encode_channel_payload,
+                    channel_id,
+                    payload,
+                )
+
+    def test_decode_rejects_non_buffer(self):
+        with self.assertRaises(TypeError):
+            _speedups.decode_frames("not a buffer")
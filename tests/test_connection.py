@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 
 import logging
+import tempfile
 import unittest
 
+from unittest import mock
+
 
 try:
     import tcpchan  # noqa: F401
@@ -12,6 +15,7 @@ except ImportError:
 
     sys.path.append(os.path.abspath(os.path.join(os.getcwd(), "..")))
 
+from tcpchan.core import conn as conn_module
 from tcpchan.core.chan import Channel
 from tcpchan.core.conn import ClientConnection
 from tcpchan.core.conn import Connection
@@ -19,15 +23,35 @@ from tcpchan.core.conn import ServerConnection
 from tcpchan.core.evt import ChannelClosed
 from tcpchan.core.evt import ChannelCreated
 from tcpchan.core.evt import DataTransmit
+from tcpchan.core.evt import FileTransmit
 from tcpchan.core.evt import HandshakeFailed
 from tcpchan.core.evt import HandshakeSuccess
+from tcpchan.core.evt import ProtocolError
+from tcpchan.core.evt import VectorTransmit
+from tcpchan.core.group import ChannelGroup
+from tcpchan.core.msg import TCPCHAN_FLAG_FIN
+from tcpchan.core.msg import ChannelPayload
 from tcpchan.core.msg import CloseChannelRequest
 from tcpchan.core.msg import CreateChannelRequest
+from tcpchan.core.msg import CreateChannelWithPayload
 from tcpchan.core.msg import HandshakeReply
 from tcpchan.core.msg import HandshakeRequest
 from tcpchan.core.msg import TCPChanMessage
 
 
+class RecordingChannel(Channel):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.received = []
+        self.eof = False
+
+    def data_received(self, data):
+        self.received.append(data)
+
+    def eof_received(self):
+        self.eof = True
+
+
 class TestTCPChanConnection(unittest.TestCase):
     def setUp(self):
         logging.root.handlers = []
@@ -56,16 +80,383 @@ class TestTCPChanConnection(unittest.TestCase):
         self.assertEqual(ev.channel_id, 1234)
         self.assertEqual(ev.channel.channel_id, 1234)
 
-    def test_create_duplicated_channel(self):
-        conn = Connection(lambda: Channel())
+    def test_create_channel_with_payload(self):
+        conn = Connection(RecordingChannel)
         conn.connection_established()
 
-        # CreateChannelRequest
-        msg = CreateChannelRequest(Channel=1234)
+        # CreateChannelWithPayload
+        msg = CreateChannelWithPayload(
+            Channel=1234, Flags=TCPCHAN_FLAG_FIN, Payload=b"request"
+        )
         conn.data_received(msg.pack())
 
-        with self.assertRaises(Exception):
+        ev = conn.next_event()
+
+        self.assertEqual(ev.__class__, ChannelCreated)
+        self.assertEqual(ev.channel_id, 1234)
+        self.assertEqual(ev.channel.received, [b"request"])
+        self.assertTrue(ev.channel.eof)
+
+    def test_create_channel_with_payload_active(self):
+        client_conn = Connection(RecordingChannel)
+        server_conn = Connection(RecordingChannel)
+
+        channel = client_conn.create_channel(1234, data=b"request")
+        ev = client_conn.next_event()  # Data transmission
+        self.assertEqual(type(ev), DataTransmit)
+
+        msg, _ = TCPChanMessage.from_bytes(ev.payload)
+        self.assertEqual(type(msg), CreateChannelWithPayload)
+        self.assertEqual(msg.Channel, channel.channel_id)
+        self.assertEqual(msg.Flags, 0)
+
+        server_conn.data_received(ev.payload)
+        ev = server_conn.next_event()
+        self.assertEqual(ev.channel.received, [b"request"])
+        self.assertFalse(ev.channel.eof)
+
+        with self.assertRaises(ValueError):
+            client_conn.create_channel(data=b"x" * 0x10000)
+
+    def test_write_after_fin(self):
+        conn = Connection(RecordingChannel)
+
+        channel = conn.create_channel(1234, data=b"request", fin=True)
+        self.assertTrue(channel.fin_sent)
+        while conn.next_event() is not None:
+            pass
+
+        # Writes after FIN are dropped
+        with tempfile.TemporaryFile() as f:
+            f.write(b"data")
+            channel.write_data(b"more")
+            channel.send_file(f)
+
+        self.assertEqual(conn.next_event(), None)
+        self.assertFalse(conn.create_channel(5678, data=b"request").fin_sent)
+
+    def test_batch_write_after_fin(self):
+        conn = Connection(RecordingChannel)
+
+        channel = conn.create_channel(1234, data=b"request", fin=True)
+        other = conn.create_channel(5678)
+        while conn.next_event() is not None:
+            pass
+
+        with self.assertRaises(ValueError):
+            ChannelGroup([channel])
+
+        # Data of the channel which sent FIN is dropped
+        conn.transmit_many([(1234, b"more")])
+        self.assertEqual(conn.next_event(), None)
+
+        expected = ChannelPayload(Channel=5678, Payload=b"data").pack()
+        conn.transmit_many([(1234, b"more"), (5678, b"data")])
+        self.assertEqual(conn.next_event().payload, expected)
+
+        conn.channel_transmit_shared([1234, 5678], b"data")
+        ev = conn.next_event()
+        self.assertEqual(type(ev), VectorTransmit)
+        self.assertEqual(b"".join(ev.buffers), expected)
+
+        ChannelGroup([other]).write_data(b"data")
+        self.assertEqual(type(conn.next_event()), VectorTransmit)
+
+    def test_message_mode(self):
+        client_conn = Connection(lambda: RecordingChannel(message_mode=True))
+        server_conn = Connection(RecordingChannel)
+
+        channel = client_conn.create_channel(1234)
+        server_conn.data_received(client_conn.next_event().payload)
+        client_conn.next_event()  # Channel created event
+        ev = server_conn.next_event()  # Channel created event
+
+        messages = [b"", b"small", bytes(range(256)) * 1000]
+        for message in messages:
+            channel.write_data(message)
+
+        data = b"".join(client_conn.next_event().payload for _ in messages)
+        for i in range(0, len(data), 1000):
+            server_conn.data_received(data[i : i + 1000])
+
+        self.assertEqual(ev.channel.received, messages)
+
+    def test_message_mode_first_payload(self):
+        client_conn = Connection(lambda: RecordingChannel(message_mode=True))
+        server_conn = Connection(RecordingChannel)
+
+        message = bytes(range(256)) * 1000
+        channel = client_conn.create_channel(1234, data=message, fin=True)
+        self.assertTrue(channel.fin_sent)
+
+        ev = client_conn.next_event()
+        while type(ev) == DataTransmit:
+            server_conn.data_received(ev.payload)
+            ev = client_conn.next_event()
+        self.assertEqual(type(ev), ChannelCreated)
+
+        ev = server_conn.next_event()  # Channel created event
+        self.assertEqual(ev.channel.received, [message])
+        self.assertTrue(ev.channel.eof)
+
+        with self.assertRaises(ValueError):
+            client_conn.create_channel(data=b"x" * (channel.max_message_size + 1))
+        self.assertEqual(client_conn.next_event(), None)
+
+    def test_message_mode_group(self):
+        client_conn = Connection(lambda: RecordingChannel(message_mode=True))
+        server_conn = Connection(RecordingChannel)
+
+        channel = client_conn.create_channel(1234)
+        server_conn.data_received(client_conn.next_event().payload)
+        client_conn.next_event()  # Channel created event
+        ev = server_conn.next_event()  # Channel created event
+
+        # Groups send stream payload regardless of the message mode
+        data = b"x" * 100000
+        ChannelGroup([channel]).write_data(data)
+        server_conn.data_received(b"".join(client_conn.next_event().buffers))
+
+        self.assertEqual(len(ev.channel.received), 2)
+        self.assertEqual(b"".join(ev.channel.received), data)
+
+    def test_message_mode_oversized(self):
+        client_conn = Connection(lambda: RecordingChannel(message_mode=True))
+        server_conn = Connection(lambda: RecordingChannel(max_message_size=100000))
+
+        channel = client_conn.create_channel(1234)
+        server_conn.data_received(client_conn.next_event().payload)
+        client_conn.next_event()  # Channel created event
+        ev = server_conn.next_event()  # Channel created event
+
+        with self.assertRaises(ValueError):
+            channel.write_data(b"x" * (channel.max_message_size + 1))
+
+        channel.write_data(b"x" * 200000)
+        server_conn.data_received(client_conn.next_event().payload)
+
+        self.assertEqual(ev.channel.received, [])
+        self.assertTrue(ev.channel.is_closed)
+        self.assertEqual(server_conn.get_channel(1234), None)
+
+    def test_send_file(self):
+        client_conn = Connection(RecordingChannel)
+        server_conn = Connection(RecordingChannel)
+
+        channel = client_conn.create_channel(1234)
+        server_conn.data_received(client_conn.next_event().payload)
+        client_conn.next_event()  # Channel created event
+        ev = server_conn.next_event()  # Channel created event
+
+        content = bytes(range(256)) * 1000
+        with tempfile.TemporaryFile() as f:
+            f.write(content)
+            channel.send_file(f, offset=10)
+
+            file_ev = client_conn.next_event()
+            self.assertEqual(type(file_ev), FileTransmit)
+            self.assertTrue(file_ev.closefd)
+
+        # The event keeps its own file open
+        with file_ev.file:
+            for header, offset, count in file_ev.segments:
+                file_ev.file.seek(offset)
+                server_conn.data_received(header + file_ev.file.read(count))
+
+        self.assertEqual(b"".join(ev.channel.received), content[10:])
+
+    def test_send_file_out_of_range(self):
+        conn = Connection(RecordingChannel)
+        channel = conn.create_channel(1234)
+        while conn.next_event() is not None:
+            pass
+
+        with tempfile.TemporaryFile() as f:
+            f.write(b"x" * 1000)
+            f.flush()
+
+            for offset, count in ((0, 5000), (1001, None), (-1, 10), (10, -1)):
+                with self.assertRaises(ValueError):
+                    channel.send_file(f, offset, count)
+
+            channel.send_file(f, 1000)
+            channel.send_file(f, 0, 1000)
+
+        ev = conn.next_event()
+        ev.file.close()
+        self.assertEqual(type(ev), FileTransmit)
+        self.assertEqual(conn.next_event(), None)
+
+    def test_transmit_many(self):
+        client_conn = Connection(RecordingChannel)
+        server_conn = Connection(RecordingChannel)
+
+        channels = []
+        for channel_id in (1, 2, 3):
+            client_conn.create_channel(channel_id)
+            server_conn.data_received(client_conn.next_event().payload)
+            client_conn.next_event()  # Channel created event
+            channels.append(server_conn.next_event().channel)
+
+        items = [(1, b"one"), (2, b""), (3, b"three"), (1, b"uno")]
+        client_conn.transmit_many(items)
+
+        ev = client_conn.next_event()
+        self.assertEqual(type(ev), DataTransmit)
+        self.assertEqual(client_conn.next_event(), None)
+        self.assertEqual(
+            ev.payload,
+            b"".join(ChannelPayload(Channel=c, Payload=d).pack() for c, d in items),
+        )
+
+        server_conn.data_received(ev.payload)
+        self.assertEqual(
+            [c.received for c in channels], [[b"one", b"uno"], [b""], [b"three"]]
+        )
+
+    def test_unknown_opcode(self):
+        conn = Connection(RecordingChannel)
+        conn.connection_established()
+
+        msg = CreateChannelRequest(Channel=1234)
+        conn.data_received(msg.pack() + b"\x00\xff garbage")
+
+        ev = conn.next_event()  # Channel created event
+        self.assertEqual(type(ev), ChannelCreated)
+
+        ev = conn.next_event()
+        self.assertEqual(type(ev), ProtocolError)
+        self.assertEqual(conn.buffered, 0)
+
+        # Further data is ignored
+        conn.data_received(CreateChannelRequest(Channel=5678).pack())
+        self.assertEqual(conn.next_event(), None)
+
+        with self.assertRaises(ValueError):
+            TCPChanMessage.from_bytes(b"\x00\xff garbage")
+
+    def test_oversized_frame_header(self):
+        conn = Connection(RecordingChannel, max_frame_length=100)
+        conn.connection_established()
+        conn.data_received(CreateChannelRequest(Channel=1234).pack())
+        conn.next_event()  # Channel created event
+
+        # Rejected as soon as the header arrives
+        data = ChannelPayload(Channel=1234, Payload=b"x" * 1000).pack()
+        conn.data_received(data[:10])
+
+        ev = conn.next_event()
+        self.assertEqual(type(ev), ProtocolError)
+        self.assertEqual(conn.buffered, 0)
+
+        conn.data_received(data[10:])
+        self.assertEqual(conn.next_event(), None)
+        self.assertEqual(conn.get_channel(1234).received, [])
+
+    def test_oversized_complete_frame(self):
+        conn = Connection(RecordingChannel, max_frame_length=100)
+        conn.connection_established()
+
+        data = CreateChannelWithPayload(Channel=1234, Flags=0, Payload=b"x" * 91)
+        conn.data_received(data.pack())
+        self.assertEqual(type(conn.next_event()), ChannelCreated)
+
+        data = CreateChannelWithPayload(Channel=5678, Flags=0, Payload=b"x" * 92)
+        conn.data_received(data.pack())
+        self.assertEqual(type(conn.next_event()), ProtocolError)
+        self.assertEqual(conn.get_channel(5678), None)
+
+    def test_max_frame_length_segmentation(self):
+        with self.assertRaises(ValueError):
+            Connection(RecordingChannel, max_frame_length=8)
+
+        # Frames without payload are accepted by the smallest limit
+        request = CreateChannelRequest(Channel=1234).pack()
+        for size in (1, len(request)):
+            conn = Connection(RecordingChannel, max_frame_length=9)
+            conn.connection_established()
+
+            for i in range(0, len(request), size):
+                conn.data_received(request[i : i + size])
+
+            self.assertEqual(type(conn.next_event()), ChannelCreated)
+
+        data = ChannelPayload(Channel=1234, Payload=b"x" * 1000).pack()
+
+        # Frames are accepted regardless of segmentation
+        for size in (1, 100, len(data)):
+            conn = Connection(RecordingChannel, max_frame_length=len(data))
+            conn.connection_established()
+            conn.data_received(CreateChannelRequest(Channel=1234).pack())
+
+            for i in range(0, len(data), size):
+                conn.data_received(data[i : i + size])
+
+            self.assertEqual(b"".join(conn.get_channel(1234).received), b"x" * 1000)
+            self.assertEqual(conn.buffered, 0)
+
+    def test_skip_decoding_incomplete_frame(self):
+        conn = Connection(RecordingChannel)
+        conn.connection_established()
+        conn.data_received(CreateChannelRequest(Channel=1234).pack())
+
+        data = ChannelPayload(Channel=1234, Payload=b"x" * 1000).pack()
+        with mock.patch.object(
+            conn_module, "decode_frames", wraps=conn_module.decode_frames
+        ) as decode_frames:
+            for i in range(0, len(data), 100):
+                conn.data_received(data[i : i + 100])
+
+        # Decoded once for the header and once for the complete frame
+        self.assertEqual(decode_frames.call_count, 2)
+        self.assertEqual(conn.get_channel(1234).received, [b"x" * 1000])
+        self.assertEqual(conn.buffered, 0)
+
+    def test_channel_pool(self):
+        conn = Connection(RecordingChannel, channel_pool_size=1)
+        conn.connection_established()
+
+        first = conn.create_channel(channel_id=1)
+        second = conn.create_channel(channel_id=2)
+        first.add_close_callback(lambda channel: None)
+        first.close()
+        second.close()
+
+        # Only one closed channel is kept for reuse
+        reused = conn.create_channel(channel_id=3)
+        self.assertIs(reused, first)
+        self.assertEqual(reused.channel_id, 3)
+        self.assertIs(reused.connection, conn)
+        self.assertFalse(reused.is_closed)
+        self.assertEqual(reused._close_callbacks, [])
+
+        self.assertIsNot(conn.create_channel(channel_id=4), second)
+
+        # Pooling is disabled by default
+        conn = Connection(RecordingChannel)
+        conn.create_channel(channel_id=1).close()
+        self.assertEqual(conn._channel_pool, [])
+
+    def test_create_duplicated_channel(self):
+        for duplicate in (
+            CreateChannelRequest(Channel=1234),
+            CreateChannelWithPayload(Channel=1234, Flags=0, Payload=b"data"),
+        ):
+            conn = Connection(RecordingChannel)
+            conn.connection_established()
+
+            # CreateChannelRequest
+            msg = CreateChannelRequest(Channel=1234)
             conn.data_received(msg.pack())
+            self.assertEqual(type(conn.next_event()), ChannelCreated)
+
+            # Frames following the duplicate are not dispatched
+            payload = ChannelPayload(Channel=1234, Payload=b"data")
+            conn.data_received(duplicate.pack() + payload.pack())
+
+            self.assertEqual(type(conn.next_event()), ProtocolError)
+            self.assertEqual(conn.next_event(), None)
+            self.assertEqual(conn.get_channel(1234).received, [])
 
     def test_close_channel_passive(self):
         conn = Connection(lambda: Channel())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+import unittest
+
+
+try:
+    import tcpchan  # noqa: F401
+except ImportError:
+    import os
+    import sys
+
+    sys.path.append(os.path.abspath(os.path.join(os.getcwd(), "..")))
+
+from tcpchan.core.chan import Channel
+from tcpchan.core.conn import Connection
+from tcpchan.core.evt import VectorTransmit
+from tcpchan.core.group import ChannelGroup
+from tcpchan.core.msg import CloseChannelRequest
+
+
+class RecordingChannel(Channel):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.received = bytearray()
+
+    def data_received(self, data):
+        self.received += data
+
+
+def connect():
+    """ Create a pair of connections with channels 1 and 2 on both ends
+    """
+    conn = Connection(RecordingChannel)
+    peer = Connection(RecordingChannel)
+
+    for channel_id in (1, 2):
+        conn.create_channel(channel_id)
+        peer.data_received(conn.next_event().payload)
+        conn.next_event()  # Channel created event
+
+    while peer.next_event() is not None:
+        pass
+
+    return conn, peer
+
+
+class TestChannelGroup(unittest.TestCase):
+    def test_write_data(self):
+        conn_a, peer_a = connect()
+        conn_b, peer_b = connect()
+
+        group = ChannelGroup(
+            [conn_a.get_channel(1), conn_a.get_channel(2), conn_b.get_channel(1)]
+        )
+        self.assertEqual(len(group), 3)
+
+        data = bytes(range(256)) * 300
+        group.write_data(data)
+
+        ev_a = conn_a.next_event()
+        ev_b = conn_b.next_event()
+        self.assertEqual(type(ev_a), VectorTransmit)
+        self.assertEqual(type(ev_b), VectorTransmit)
+
+        # Payload buffers are shared among frames and connections
+        payloads = ev_a.buffers[1::2] + ev_b.buffers[1::2]
+        self.assertTrue(all(p.obj is data for p in payloads))
+
+        peer_a.data_received(b"".join(ev_a.buffers))
+        peer_b.data_received(b"".join(ev_b.buffers))
+
+        self.assertEqual(peer_a.get_channel(1).received, data)
+        self.assertEqual(peer_a.get_channel(2).received, data)
+        self.assertEqual(peer_b.get_channel(1).received, data)
+        self.assertEqual(peer_b.get_channel(2).received, b"")
+
+    def test_membership(self):
+        conn, _ = connect()
+        channel = conn.get_channel(1)
+
+        group = ChannelGroup()
+        group.add(channel)
+        group.add(channel)
+        self.assertEqual(len(group), 1)
+        self.assertIn(channel, group)
+
+        group.discard(channel)
+        self.assertEqual(len(group), 0)
+        self.assertNotIn(channel, group)
+
+        channel.close()
+        with self.assertRaises(ValueError):
+            group.add(channel)
+
+    def test_remove_closed_channels(self):
+        conn, _ = connect()
+        group = ChannelGroup([conn.get_channel(1), conn.get_channel(2)])
+
+        # Actively closed channel
+        conn.close_channel(1)
+        # Channel closed by the other end
+        conn.data_received(CloseChannelRequest(Channel=2).pack())
+
+        self.assertEqual(len(group), 0)
+        self.assertEqual(list(group), [])
+
+        while conn.next_event() is not None:
+            pass
+
+        group.write_data(b"data")
+        self.assertEqual(conn.next_event(), None)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+import importlib
+import os
+import subprocess
+import sys
+import unittest
+
+
+try:
+    import tcpchan  # noqa: F401
+except ImportError:
+    sys.path.append(os.path.abspath(os.path.join(os.getcwd(), "..")))
+
+import tcpchan.aio
+import tcpchan.core
+
+
+LAZY_IMPORT = """
+import sys
+from tcpchan.core import Connection
+assert "fpack" not in sys.modules
+assert "tcpchan.core.msg" not in sys.modules
+assert "tcpchan.aio" not in sys.modules
+"""
+
+
+class TestTCPChanPackage(unittest.TestCase):
+    def test_lazy_import(self):
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            [os.path.dirname(os.path.dirname(tcpchan.__file__))]
+            + env.get("PYTHONPATH", "").split(os.pathsep)
+        )
+        subprocess.run([sys.executable, "-c", LAZY_IMPORT], env=env, check=True)
+
+    def test_exports(self):
+        for package in (tcpchan.core, tcpchan.aio):
+            exported = []
+            for submodule in package._submodule_attrs:
+                module = importlib.import_module(f"{package.__name__}.{submodule}")
+                exported += module.__all__
+
+                for name in module.__all__:
+                    self.assertIs(getattr(package, name), getattr(module, name))
+
+            self.assertEqual(sorted(package.__all__), sorted(exported))
+
+        self.assertIs(tcpchan.core.conn, sys.modules["tcpchan.core.conn"])
+
+        with self.assertRaises(AttributeError):
+            tcpchan.core.nonexistent
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+
+import asyncio
+import tempfile
+import unittest
+
+
+try:
+    import tcpchan  # noqa: F401
+except ImportError:
+    import os
+    import sys
+
+    sys.path.append(os.path.abspath(os.path.join(os.getcwd(), "..")))
+
+from tcpchan.aio import TCPChanClientProtocol
+from tcpchan.aio import TCPChanServerProtocol
+from tcpchan.aio.proto import RECV_BUFFER_MAX_SIZE
+from tcpchan.aio.proto import RECV_BUFFER_SIZE
+from tcpchan.aio.proto import RECV_SHRINK_READS
+from tcpchan.core.chan import Channel
+from tcpchan.core.msg import ChannelPayload
+from tcpchan.core.msg import CreateChannelRequest
+
+
+class RecordingChannel(Channel):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.received = bytearray()
+
+    def data_received(self, data):
+        self.received += data
+
+
+class EchoChannel(Channel):
+    def data_received(self, data):
+        self.write_data(data)
+
+
+class ServerProtocol(TCPChanServerProtocol):
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.channels = {}
+        self.instances.append(self)
+
+    def channel_created(self, channel):
+        self.channels[channel.channel_id] = channel
+
+
+class ClientProtocol(TCPChanClientProtocol):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ready = asyncio.get_event_loop().create_future()
+
+    def handshake_success(self):
+        self.ready.set_result(None)
+
+
+class FakeTLSTransport(asyncio.Transport):
+    def __init__(self):
+        super().__init__()
+        self.written = bytearray()
+        self.closed = False
+
+    def get_extra_info(self, name, default=None):
+        if name == "sslcontext":
+            return object()
+
+        return default
+
+    def write(self, data):
+        self.written += data
+
+    def close(self):
+        self.closed = True
+
+    def is_closing(self):
+        return False
+
+
+class RecordingTransport(asyncio.Transport):
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+
+    def writelines(self, list_of_data):
+        self.write(b"".join(list_of_data))
+
+
+class TestTCPChanProtocolReceive(unittest.TestCase):
+    def setUp(self):
+        self.transport = RecordingTransport()
+        self.protocol = TCPChanServerProtocol(EchoChannel)
+        self.protocol.connection_made(self.transport)
+
+    def receive(self, data):
+        buf = self.protocol.get_buffer(-1)
+        buf[: len(data)] = data
+        self.protocol.buffer_updated(len(data))
+
+    def test_batched_writes(self):
+        frames = [ChannelPayload(Channel=1, Payload=b"%d" % i) for i in range(100)]
+        self.receive(
+            CreateChannelRequest(Channel=1).pack()
+            + b"".join(frame.pack() for frame in frames)
+        )
+
+        # Frames echoed in response to a single read are written at once
+        self.assertEqual(self.transport.writes, [b"".join(f.pack() for f in frames)])
+
+    def test_adaptive_buffer_size(self):
+        self.assertEqual(self.protocol.recv_buffer_size, RECV_BUFFER_SIZE)
+        self.receive(CreateChannelRequest(Channel=1).pack())
+
+        # Grow while reads fill the buffer
+        data = ChannelPayload(Channel=1, Payload=b"x" * 60000).pack() * 4
+        data = data[: 3 * RECV_BUFFER_SIZE]
+        while data:
+            size = self.protocol.recv_buffer_size
+            self.receive(data[:size])
+            data = data[size:]
+
+        self.assertEqual(self.protocol.recv_buffer_size, 4 * RECV_BUFFER_SIZE)
+
+        # Shrink after a run of small reads
+        for _ in range(RECV_SHRINK_READS):
+            self.receive(ChannelPayload(Channel=1, Payload=b"x").pack())
+
+        self.assertEqual(self.protocol.recv_buffer_size, 2 * RECV_BUFFER_SIZE)
+
+        # Grow to fit the pending frame
+        self.protocol._tcpchan._need = 3 * RECV_BUFFER_SIZE
+        self.protocol._adapt_recv_buffer(1)
+        self.assertEqual(self.protocol.recv_buffer_size, 4 * RECV_BUFFER_SIZE)
+
+        self.protocol._tcpchan._need = 10 * RECV_BUFFER_MAX_SIZE
+        self.protocol._adapt_recv_buffer(1)
+        self.assertEqual(self.protocol.recv_buffer_size, RECV_BUFFER_MAX_SIZE)
+
+
+class TestTCPChanProtocolTLS(unittest.TestCase):
+    def test_send_file_fallback(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        transport = FakeTLSTransport()
+        protocol = TCPChanClientProtocol(RecordingChannel)
+        protocol.connection_made(transport)
+        channel = protocol.create_channel()
+        del transport.written[:]
+
+        content = bytes(range(256)) * 1000
+        with tempfile.TemporaryFile() as f:
+            f.write(content)
+            f.flush()
+
+            channel.send_file(f)
+            loop.run_until_complete(asyncio.sleep(0.01))
+
+        server = TCPChanServerProtocol(RecordingChannel)
+        server.connection_made(FakeTLSTransport())
+        server._tcpchan._create_channel(channel.channel_id)
+        server.data_received(transport.written)
+
+        received = server._tcpchan.get_channel(channel.channel_id).received
+        self.assertEqual(received, content)
+
+        loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_send_file_fallback_short(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        transport = FakeTLSTransport()
+        protocol = TCPChanClientProtocol(RecordingChannel)
+        protocol.connection_made(transport)
+        channel = protocol.create_channel()
+        del transport.written[:]
+
+        with tempfile.TemporaryFile() as f:
+            f.write(b"x" * 1000)
+            f.flush()
+
+            channel.send_file(f)
+            f.truncate(100)
+            loop.run_until_complete(asyncio.sleep(0.01))
+
+        # Neither the header nor the short chunk is sent
+        self.assertTrue(transport.closed)
+        self.assertEqual(transport.written, b"")
+
+        loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_send_file_connection_lost(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        for started in (False, True):
+            transport = FakeTLSTransport()
+            protocol = TCPChanClientProtocol(RecordingChannel)
+            protocol.connection_made(transport)
+            channel = protocol.create_channel()
+
+            with tempfile.TemporaryFile() as f:
+                f.write(b"x" * 100000)
+                f.flush()
+
+                channel.send_file(f)
+                channel.send_file(f)
+                files = [ev.file for ev in protocol._write_backlog]
+
+            if started:
+                # Block the transmission after the first chunk
+                protocol.pause_writing()
+                loop.run_until_complete(asyncio.sleep(0.01))
+
+            written = len(transport.written)
+            protocol.connection_lost(None)
+            loop.run_until_complete(asyncio.sleep(0.01))
+
+            # The transmission is cancelled and the files are released
+            self.assertEqual(len(transport.written), written)
+            self.assertEqual(protocol._write_backlog, None)
+            self.assertTrue(all(f.closed for f in files))
+
+        loop.close()
+        asyncio.set_event_loop(None)
+
+
+class TestTCPChanProtocol(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        ServerProtocol.instances = []
+
+        self.server = self.loop.run_until_complete(
+            self.loop.create_server(
+                lambda: ServerProtocol(RecordingChannel), host="127.0.0.1", port=0
+            )
+        )
+        port = self.server.sockets[0].getsockname()[1]
+
+        self.transport, self.client = self.loop.run_until_complete(
+            self.loop.create_connection(
+                lambda: ClientProtocol(RecordingChannel), host="127.0.0.1", port=port
+            )
+        )
+        self.loop.run_until_complete(self.client.ready)
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def wait_for_data(self, channel_id, size):
+        async def wait():
+            while True:
+                channel = ServerProtocol.instances[0].channels.get(channel_id)
+                if channel is not None and len(channel.received) >= size:
+                    return channel.received
+
+                await asyncio.sleep(0.001)
+
+        return self.loop.run_until_complete(asyncio.wait_for(wait(), 5))
+
+    def test_send_file(self):
+        content = bytes(range(256)) * 1000
+
+        with tempfile.TemporaryFile() as f:
+            f.write(content)
+            f.flush()
+
+            channel = self.client.create_channel()
+            channel.write_data(b"head")
+            channel.send_file(f)
+            channel.write_data(b"tail")
+
+            received = self.wait_for_data(channel.channel_id, len(content) + 8)
+
+        self.assertEqual(received, b"head" + content + b"tail")
+
+    def test_send_file_closed_after_call(self):
+        content = bytes(range(256)) * 1000
+
+        with tempfile.TemporaryFile() as f:
+            f.write(content)
+            f.flush()
+
+            channel = self.client.create_channel()
+            channel.send_file(f)
+
+        received = self.wait_for_data(channel.channel_id, len(content))
+        self.assertEqual(received, content)
+        self.assertFalse(self.transport.is_closing())
+
+    def test_send_file_short(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(b"x" * 1000)
+            f.flush()
+
+            channel = self.client.create_channel()
+            channel.send_file(f)
+            f.truncate(100)
+            channel.write_data(b"tail")
+
+            async def wait_closed():
+                while not self.transport.is_closing():
+                    await asyncio.sleep(0.001)
+
+            self.loop.run_until_complete(asyncio.wait_for(wait_closed(), 5))
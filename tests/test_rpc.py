@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+import asyncio
+import unittest
+
+
+try:
+    import tcpchan  # noqa: F401
+except ImportError:
+    import os
+    import sys
+
+    sys.path.append(os.path.abspath(os.path.join(os.getcwd(), "..")))
+
+from tcpchan.aio.rpc import RPCChannel
+from tcpchan.aio.rpc import RPCError
+from tcpchan.core.conn import Connection
+from tcpchan.core.evt import DataTransmit
+from tcpchan.core.rpc import RPC_KIND_REQUEST
+from tcpchan.core.rpc import RPC_KIND_RESPONSE
+from tcpchan.core.rpc import RPCDecoder
+from tcpchan.core.rpc import encode_rpc_message
+
+
+def link(conn, peer, loop):
+    """ Deliver transmitted data of ```conn``` to ```peer``` on the event loop
+    """
+
+    def event_callback():
+        while True:
+            ev = conn.next_event()
+            if ev is None:
+                break
+
+            if type(ev) == DataTransmit:
+                loop.call_soon(peer.data_received, ev.payload)
+
+    conn._event_callback = event_callback
+
+
+class EchoChannel(RPCChannel):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.concurrency = 0
+        self.max_concurrency = 0
+
+    async def request_received(self, payload):
+        if payload == b"fail":
+            raise ValueError("request failed")
+
+        self.concurrency += 1
+        self.max_concurrency = max(self.max_concurrency, self.concurrency)
+        if payload == b"hang":
+            await asyncio.Event().wait()
+
+        await asyncio.sleep(0.01 if payload == b"slow" else 0)
+        self.concurrency -= 1
+
+        return payload
+
+
+class TestRPCDecoder(unittest.TestCase):
+    def test_decode_fragmented(self):
+        data = encode_rpc_message(RPC_KIND_REQUEST, 1, b"hello")
+        data += encode_rpc_message(RPC_KIND_RESPONSE, 2, b"world")
+
+        decoder = RPCDecoder()
+        messages = []
+        for i in range(len(data)):
+            messages += decoder.feed(data[i : i + 1])
+
+        self.assertEqual(
+            messages,
+            [(RPC_KIND_REQUEST, 1, b"hello"), (RPC_KIND_RESPONSE, 2, b"world")],
+        )
+
+    def test_decode_oversized(self):
+        decoder = RPCDecoder(max_message_size=4)
+
+        with self.assertRaises(ValueError):
+            decoder.feed(encode_rpc_message(RPC_KIND_REQUEST, 1, b"hello"))
+
+
+class TestRPCChannel(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.client_conn = Connection(lambda: EchoChannel(max_in_flight=2))
+        self.server_conn = Connection(lambda: EchoChannel())
+        link(self.client_conn, self.server_conn, self.loop)
+        link(self.server_conn, self.client_conn, self.loop)
+
+        self.client = self.client_conn.create_channel(1234)
+
+    def tearDown(self):
+        self.loop.run_until_complete(asyncio.sleep(0.02))
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_call(self):
+        self.assertEqual(self.run_async(self.client.call(b"hello")), b"hello")
+
+    def test_call_large_payload(self):
+        payload = bytes(range(256)) * 1024
+        self.assertEqual(self.run_async(self.client.call(payload)), payload)
+
+    def test_pipelined_calls(self):
+        calls = [self.client.call(b"slow"), self.client.call(b"fast")]
+        results = self.run_async(asyncio.gather(*calls))
+
+        self.assertEqual(results, [b"slow", b"fast"])
+        self.assertEqual(self.client._pending, {})
+
+    def test_max_in_flight(self):
+        calls = [self.client.call(b"slow") for _ in range(6)]
+        self.run_async(asyncio.gather(*calls))
+
+        server = self.server_conn.get_channel(1234)
+        self.assertEqual(server.max_concurrency, 2)
+
+    def test_remote_error(self):
+        with self.assertRaises(RPCError):
+            self.run_async(self.client.call(b"fail"))
+
+    def test_timeout(self):
+        with self.assertRaises(asyncio.TimeoutError):
+            self.run_async(self.client.call(b"slow", timeout=0.001))
+
+        self.assertEqual(self.client._pending, {})
+
+        # Late response of the timed out call is dropped
+        self.run_async(asyncio.sleep(0.02))
+        self.assertEqual(self.run_async(self.client.call(b"hello")), b"hello")
+
+    def test_close_fails_pending_calls(self):
+        async def call_and_close():
+            call = asyncio.ensure_future(self.client.call(b"slow"))
+            await asyncio.sleep(0)
+            self.client.close()
+            await call
+
+        with self.assertRaises(ConnectionError):
+            self.run_async(call_and_close())
+
+    def test_close_cancels_request_handlers(self):
+        async def call_and_close():
+            call = asyncio.ensure_future(self.client.call(b"hang"))
+            await asyncio.sleep(0.01)
+
+            server = self.server_conn.get_channel(1234)
+            tasks = list(server._request_tasks)
+            self.assertEqual(len(tasks), 1)
+
+            server.close()
+            await asyncio.sleep(0)
+
+            self.assertTrue(tasks[0].cancelled())
+            self.assertEqual(server._request_tasks, set())
+
+            with self.assertRaises(ConnectionError):
+                await call
+
+        self.run_async(call_and_close())
+
+
+class TestRPCChannelPooling(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.client_conn = Connection(
+            lambda: EchoChannel(max_in_flight=1), channel_pool_size=4
+        )
+        self.server_conn = Connection(lambda: EchoChannel())
+        link(self.client_conn, self.server_conn, self.loop)
+        link(self.server_conn, self.client_conn, self.loop)
+
+    def tearDown(self):
+        self.loop.run_until_complete(asyncio.sleep(0.02))
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_queued_call_after_reuse(self):
+        async def call_close_and_reuse():
+            client = self.client_conn.create_channel(1234)
+            first = asyncio.ensure_future(client.call(b"slow"))
+            queued = asyncio.ensure_future(client.call(b"queued"))
+            await asyncio.sleep(0)
+
+            client.close()
+            reused = self.client_conn.create_channel(5678)
+            self.assertIs(reused, client)
+
+            for call in (first, queued):
+                with self.assertRaises(ConnectionError):
+                    await call
+
+            # Nothing is sent on the reused channel by the queued call
+            await asyncio.sleep(0.02)
+            self.assertEqual(self.server_conn.get_channel(5678).max_concurrency, 0)
+
+            self.assertEqual(await reused.call(b"hello"), b"hello")
+            self.assertEqual(reused._next_id, 1)
+
+        self.loop.run_until_complete(call_close_and_reuse())
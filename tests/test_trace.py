@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+import io
+import random
+import unittest
+
+
+try:
+    import tcpchan  # noqa: F401
+except ImportError:
+    import os
+    import sys
+
+    sys.path.append(os.path.abspath(os.path.join(os.getcwd(), "..")))
+
+from tcpchan.core.codec import TCPCHAN_MAX_FRAME_LENGTH
+from tcpchan.core.conn import Connection
+from tcpchan.tools.replay import SinkChannel
+from tcpchan.tools.replay import fuzz
+from tcpchan.tools.replay import replay
+from tcpchan.tools.replay import synthetic_trace
+from tcpchan.tools.trace import CHUNKING_MODES
+from tcpchan.tools.trace import TraceWriter
+from tcpchan.tools.trace import read_trace
+from tcpchan.tools.trace import rechunk
+
+
+class TestTrace(unittest.TestCase):
+    def test_record_and_read(self):
+        chunks = [b"first", b"", b"x" * 1000]
+
+        f = io.BytesIO()
+        writer = TraceWriter(f)
+        for chunk in chunks:
+            writer.record(chunk)
+
+        f.seek(0)
+        self.assertEqual([chunk for _, chunk in read_trace(f)], chunks)
+
+    def test_read_truncated(self):
+        f = io.BytesIO()
+        TraceWriter(f).record(b"data")
+
+        with self.assertRaises(ValueError):
+            list(read_trace(io.BytesIO(f.getvalue()[:-1])))
+
+    def test_rechunk(self):
+        chunks = [b"abc", b"defgh"]
+        rng = random.Random(0)
+
+        for mode in CHUNKING_MODES:
+            self.assertEqual(b"".join(rechunk(chunks, mode, rng=rng)), b"abcdefgh")
+
+        self.assertEqual(rechunk(chunks, "byte"), [bytes([c]) for c in b"abcdefgh"])
+        self.assertEqual(rechunk(chunks, "coalesce"), [b"abcdefgh"])
+
+
+class ReceivedChannelsConnection(Connection):
+    def __init__(self):
+        super().__init__(SinkChannel)
+        self.received = []
+
+    def _handle_channel_payload(self, channel_id, flags, payload):
+        self.received.append((channel_id, payload))
+
+
+class TestReplay(unittest.TestCase):
+    def test_replay_chunking(self):
+        rng = random.Random(0)
+        chunks = synthetic_trace(rng, frames=200)
+
+        results = []
+        for mode in CHUNKING_MODES:
+            conn = ReceivedChannelsConnection()
+            _, max_buffered = replay(rechunk(chunks, mode, rng=rng), conn)
+
+            self.assertLess(max_buffered, TCPCHAN_MAX_FRAME_LENGTH)
+            self.assertEqual(conn.buffered, 0)
+            results.append(conn.received)
+
+        self.assertTrue(results[0])
+        for result in results[1:]:
+            self.assertEqual(result, results[0])
+
+    def test_fuzz(self):
+        rng = random.Random(0)
+        chunks = synthetic_trace(rng, frames=50, max_payload_size=256)
+        failures = []
+
+        self.assertEqual(fuzz(chunks, 200, rng, report=failures.append), 0)
+        self.assertEqual(failures, [])